@@ -160,6 +160,22 @@ BEGIN
 END;
 $$;
 
+-- Function 3: Exact row counts for several tables in one call
+CREATE OR REPLACE FUNCTION get_table_counts(names text[])
+RETURNS TABLE (
+    name text,
+    cnt bigint
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    FOREACH name IN ARRAY names LOOP
+        EXECUTE format('SELECT COUNT(*) FROM %I', name) INTO cnt;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
+
 -- Step 6: Insert Sample Data
 -- ============================================================================
 
@@ -269,6 +285,7 @@ COMMENT ON TABLE reviews IS 'Product reviews from customers';
 
 COMMENT ON FUNCTION match_documents IS 'Vector similarity search function for RAG context retrieval';
 COMMENT ON FUNCTION execute_safe_query(json) IS 'Safely execute queries with JSON parameter - used by backend';
+COMMENT ON FUNCTION get_table_counts(text[]) IS 'Row counts for a list of tables - used by verify_sample_data.py';
 
 -- ============================================================================
 -- SETUP COMPLETE!
@@ -1,5 +1,6 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional, Union
 
 class Settings(BaseSettings):
     """Application configuration"""
@@ -12,6 +13,9 @@ class Settings(BaseSettings):
     # Direct PostgreSQL Connection (Optional - for bypassing RPC)
     database_url: Optional[str] = None  # PostgreSQL connection string
     use_direct_postgres: bool = False  # Set to True to use direct connection instead of RPC
+    db_pool_min: int = 5  # Connections opened when the pool is created
+    db_pool_max: int = 10
+    db_statement_cache_size: int = 1024  # Prepared statements cached per connection
     
     
     # GROQ
@@ -20,12 +24,18 @@ class Settings(BaseSettings):
     
     # Embedding
     embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embedding_onnx_path: Optional[str] = None  # ONNX export of embedding_model (int8-quantized recommended)
+    embedding_tokenizer_path: Optional[str] = None  # Defaults to tokenizer.json next to the ONNX file
     openai_api_key: Optional[str] = None
+    embedding_cache_capacity: int = 1024  # Query embeddings kept in memory (LRU)
+    embedding_store_path: Optional[str] = None  # SQLite file that keeps chunk embeddings across ingestion runs
     
     # Backend
     backend_host: str = "0.0.0.0"
     backend_port: int = 8000
-    cors_origins: str = "http://localhost:3000,http://localhost:5173"
+    # Comma-separated or JSON list in .env; always a list once loaded
+    cors_origins: Union[List[str], str] = ["http://localhost:3000", "http://localhost:5173"]
+    debug: bool = False  # Enables auto-reload when running `python -m backend.main`
     
     # Security
     allow_destructive_queries: bool = True  # Enable CRUD operations
@@ -37,13 +47,30 @@ class Settings(BaseSettings):
     
     # Features
     enable_schema_cache: bool = True
+    schema_ttl: int = 300  # Seconds before cached schema is refetched
+    enable_nl_cache: bool = True  # Reuse responses for repeated SELECT questions (per process; disable with multiple workers)
+    nl_cache_ttl: int = 60
+    nl_cache_max_entries: int = 1024
+    enable_metrics_cache: bool = True  # Answer common aggregate questions without the LLM
     enable_rag: bool = False  # Temporarily disabled due to TensorFlow compatibility
     max_context_chunks: int = 5
+    semantic_cache_size: int = 512  # Retrieval results reused for paraphrased questions
+    semantic_cache_threshold: float = 0.97  # Minimum cosine similarity for a cache hit
+    semantic_cache_ttl: int = 300
+    ingest_batch_size: int = 64  # Chunks embedded and stored per round during ingestion
     
     # Logging
     log_level: str = "info"
     log_queries: bool = True
     
+    @field_validator("cors_origins", mode="before")
+    @classmethod
+    def split_cors_origins(cls, v):
+        """Parse a comma-separated CORS_ORIGINS string into a list"""
+        if isinstance(v, str):
+            return [origin.strip() for origin in v.split(",") if origin.strip()]
+        return v
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -1,15 +1,24 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import TYPE_CHECKING, Optional, List
+from functools import lru_cache
+import asyncio
+import hashlib
 import logging
+import time
 
 from backend.config import settings
-from backend.services.llm_service import LLMService
 from backend.services.supabase_service import SupabaseService
 from backend.services.postgres_service import PostgresService
-from backend.services.rag_service import RAGService
+from backend.services.metrics_service import MetricsService, normalize_query
 from backend.utils.sql_safety import SQLSafetyValidator
+from backend.utils.request_timing import RequestTimingMiddleware
+
+if TYPE_CHECKING:
+    from backend.services.llm_service import LLMService
+    from backend.services.rag_service import RAGService
 
 # Configure logging
 logging.basicConfig(
@@ -22,20 +31,36 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="NL-DB-Assistant API",
    description="Natural Language to Database Query Assistant",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # orjson handles large result sets much faster
 )
 
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.cors_origins.split(','),
+    allow_origins=settings.cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# Request timing/logging (pure ASGI, no BaseHTTPMiddleware overhead)
+app.add_middleware(RequestTimingMiddleware)
+
 # Initialize services
-llm_service = LLMService()
+# LLM and RAG services are built on first use so workers start fast and
+# requests that don't need them (e.g. /schema) never pay for them. Their
+# modules are imported inside the factories, so the Groq client and embedding
+# libraries aren't loaded at startup either.
+@lru_cache(maxsize=None)
+def get_llm_service() -> "LLMService":
+    from backend.services.llm_service import LLMService
+    return LLMService()
+
+@lru_cache(maxsize=None)
+def get_rag_service() -> "RAGService":
+    from backend.services.rag_service import RAGService
+    return RAGService()
 
 # Use Direct PostgreSQL connection if enabled, otherwise use Supabase RPC
 if settings.use_direct_postgres:
@@ -48,8 +73,50 @@ else:
 # Keep reference for compatibility
 supabase_service = db_service
 
-rag_service = RAGService()
 sql_validator = SQLSafetyValidator()
+metrics_service = MetricsService(db_service)
+
+# Cache of full /query responses for repeated SELECT questions
+# {hash of normalized query: (timestamp, response)}
+# Process-local: a write clears only this worker's copy, so run one worker
+# (or set ENABLE_NL_CACHE=false) when serving with --workers > 1
+nl_cache = {}
+
+def _nl_cache_key(query: str, use_rag: bool) -> str:
+    """Normalize a natural language query into a stable cache key"""
+    normalized = normalize_query(query)
+    return hashlib.blake2b(f"{use_rag}:{normalized}".encode()).hexdigest()
+
+def _nl_cache_get(key: str) -> Optional[dict]:
+    """Return a cached response if present and not expired"""
+    entry = nl_cache.get(key)
+    if entry is None:
+        return None
+    cached_at, response = entry
+    if time.monotonic() - cached_at >= settings.nl_cache_ttl:
+        nl_cache.pop(key, None)
+        return None
+    return response
+
+def _nl_cache_put(key: str, response: dict):
+    """Store a response, evicting the oldest entry when full"""
+    if len(nl_cache) >= settings.nl_cache_max_entries:
+        nl_cache.pop(next(iter(nl_cache)))
+    nl_cache[key] = (time.monotonic(), response)
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected
+background_tasks = set()
+
+def _log_query_in_background(**kwargs):
+    """Write the audit log entry without holding up the response"""
+    task = asyncio.create_task(supabase_service.log_query(**kwargs))
+    background_tasks.add(task)
+    task.add_done_callback(_on_log_task_done)
+
+def _on_log_task_done(task: asyncio.Task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error("Background query logging failed: %s", task.exception())
 
 # Request/Response models
 class QueryRequest(BaseModel):
@@ -90,14 +157,34 @@ async def startup_event():
             await db_service.connect()
             logger.info("✅ PostgreSQL connection pool initialized")
         except Exception as e:
-            logger.error(f"❌ Failed to initialize PostgreSQL pool: {e}")
+            logger.error("❌ Failed to initialize PostgreSQL pool: %s", e)
             raise
+    
+    # Batch audit log writes in the background
+    if isinstance(db_service, SupabaseService):
+        await db_service.start_log_flusher()
+    
+    # Pre-compute common aggregate metrics
+    if settings.enable_metrics_cache:
+        try:
+            await metrics_service.start()
+        except Exception as e:
+            logger.error("❌ Failed to pre-compute metrics: %s", e)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("🛑 Application shutting down...")
     
+    await metrics_service.stop()
+    
+    # Write any buffered audit log entries
+    if isinstance(db_service, SupabaseService):
+        await db_service.stop_log_flusher()
+        await db_service.close()
+    if get_rag_service.cache_info().currsize:
+        await get_rag_service().supabase.close()
+    
     # Close PostgreSQL connection pool
     if settings.use_direct_postgres and isinstance(db_service, PostgresService):
         await db_service.disconnect()
@@ -124,21 +211,64 @@ async def query_database(request: QueryRequest):
     Flow: User Query → RAG Context → LLM → SQL → Validation → Execution → Results
     """
     try:
-        logger.info(f"Processing query: {request.query}")
+        if settings.log_queries:
+            logger.info("Processing query: %s", request.query)
         
-        # Step 1: Get database schema
-        schema = await supabase_service.get_schema()
+        # Serve repeated questions from the response cache
+        cache_key = _nl_cache_key(request.query, request.use_rag)
+        if settings.enable_nl_cache:
+            cached_response = _nl_cache_get(cache_key)
+            if cached_response is not None:
+                logger.info("Serving query from response cache")
+                _log_query_in_background(
+                    user_query=request.query,
+                    generated_sql=cached_response['sql'],
+                    confidence=cached_response['confidence'],
+                    success=True,
+                    result_count=cached_response['result_count']
+                )
+                return cached_response
+        
+        # Answer common aggregate questions from pre-computed metrics
+        if settings.enable_metrics_cache:
+            metric_name = metrics_service.match(request.query)
+            if metric_name:
+                metric = await metrics_service.get(metric_name)
+                if metric is not None:
+                    logger.info("Serving query from metric: %s", metric_name)
+                    _log_query_in_background(
+                        user_query=request.query,
+                        generated_sql=metric['sql'],
+                        confidence=1.0,
+                        success=True,
+                        result_count=metric['count']
+                    )
+                    return {
+                        "sql": metric['sql'],
+                        "explanation": f"Pre-computed metric: {metric_name}",
+                        "confidence": 1.0,
+                        "results": metric['rows'],
+                        "result_count": metric['count'],
+                        "warnings": []
+                    }
+        
+        # Steps 1 & 2: Get database schema and RAG context (if enabled) concurrently
+        schema_task = asyncio.create_task(supabase_service.get_schema())
+        context_task = None
+        if request.use_rag and settings.enable_rag:
+            context_task = asyncio.create_task(get_rag_service().retrieve_context(request.query))
+        
+        schema = await schema_task
         if not schema:
             raise HTTPException(status_code=500, detail="Failed to fetch database schema")
         
-        # Step 2: Retrieve context using RAG (if enabled)
         context_docs = []
-        if request.use_rag and settings.enable_rag:
-            context_docs = await rag_service.retrieve_context(request.query)
-            logger.info(f"Retrieved {len(context_docs)} context documents")
+        if context_task:
+            context_docs = await context_task
+            logger.info("Retrieved %d context documents", len(context_docs))
         
         # Step 3: Generate SQL using LLM
-        llm_result = llm_service.generate_sql(
+        llm_result = await get_llm_service().generate_sql(
             user_query=request.query,
             schema_info=schema,
             context_docs=context_docs
@@ -148,7 +278,8 @@ async def query_database(request: QueryRequest):
         explanation = llm_result['explanation']
         confidence = llm_result['confidence']
         
-        logger.info(f"Generated SQL: {sql}")
+        if settings.log_queries:
+            logger.info("Generated SQL: %s", sql)
         
         # Step 4: Validate SQL for safety
         validation = sql_validator.validate(
@@ -157,20 +288,20 @@ async def query_database(request: QueryRequest):
         )
         
         # If destructive operation requires confirmation
-        if validation.get('requires_confirmation') and not request.confirm_destructive:
+        if validation.requires_confirmation and not request.confirm_destructive:
             return {
                 "requires_confirmation": True,
-                "operation_type": validation['operation_type'],
+                "operation_type": validation.operation_type,
                 "sql": sql,
                 "explanation": explanation,
                 "confidence": confidence,
-                "warning": f"This {validation['operation_type']} operation will modify data. Please confirm.",
-                "warnings": validation.get('warnings', [])
+                "warning": f"This {validation.operation_type} operation will modify data. Please confirm.",
+                "warnings": list(validation.warnings)
             }
         
-        if not validation['is_valid']:
-            error_msg = '; '.join(validation['errors'])
-            logger.error(f"SQL validation failed: {error_msg}")
+        if not validation.is_valid:
+            error_msg = '; '.join(validation.errors)
+            logger.error("SQL validation failed: %s", error_msg)
             raise HTTPException(
                 status_code=400,
                 detail=f"Generated SQL failed safety validation: {error_msg}"
@@ -185,8 +316,8 @@ async def query_database(request: QueryRequest):
                 detail=f"Query execution failed: {result.get('error', 'Unknown error')}"
             )
         
-        # Step 6: Log query for audit
-        await supabase_service.log_query(
+        # Step 6: Log query for audit (off the response path)
+        _log_query_in_background(
             user_query=request.query,
             generated_sql=sql,
             confidence=confidence,
@@ -194,24 +325,37 @@ async def query_database(request: QueryRequest):
             result_count=result['count']
         )
         
+        warnings = list(validation.warnings)
+        if result.get('truncated'):
+            warnings.append(f"Results truncated to {settings.max_rows_affected} rows")
+        
         # Step 7: Return results
-        return {
+        response = {
             "sql": sql,
             "explanation": explanation,
             "confidence": confidence,
             "results": result['rows'],
             "result_count": result['count'],
-            "warnings": validation['warnings']
+            "warnings": warnings
         }
         
+        if validation.is_destructive:
+            # Data changed, cached results may be stale
+            nl_cache.clear()
+            metrics_service.invalidate()
+        elif settings.enable_nl_cache and validation.operation_type == 'SELECT' and confidence >= 0.7:
+            _nl_cache_put(cache_key, response)
+        
+        return response
+        
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error processing query: {str(e)}")
+        logger.error("Error processing query: %s", e)
         
         # Log failed query
         if 'sql' in locals():
-            await supabase_service.log_query(
+            _log_query_in_background(
                 user_query=request.query,
                 generated_sql=sql,
                 confidence=confidence if 'confidence' in locals() else 0.0,
@@ -229,14 +373,14 @@ async def get_schema(table_name: Optional[str] = None):
         return SchemaResponse(schema=schema)
         
     except Exception as e:
-        logger.error(f"Error fetching schema: {str(e)}")
+        logger.error("Error fetching schema: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/ingest")
 async def ingest_document(request: IngestRequest):
     """Ingest a document into the RAG system"""
     try:
-        success = await rag_service.ingest_document(
+        success = await get_rag_service().ingest_document(
             content=request.content,
             metadata=request.metadata
         )
@@ -247,7 +391,7 @@ async def ingest_document(request: IngestRequest):
             raise HTTPException(status_code=500, detail="Failed to ingest document")
             
     except Exception as e:
-        logger.error(f"Error ingesting document: {str(e)}")
+        logger.error("Error ingesting document: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/health")
@@ -268,7 +412,7 @@ async def health_check():
     
     # Check LLM service
     try:
-        if llm_service.client:
+        if get_llm_service().client:
             health_status["services"]["llm"] = "ready"
         else:
             health_status["services"]["llm"] = "not initialized"
@@ -279,10 +423,13 @@ async def health_check():
     return health_status
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
     uvicorn.run(
         "backend.main:app",
         host=settings.backend_host,
         port=settings.backend_port,
-        reload=True
+        loop="asyncio" if sys.platform == "win32" else "uvloop",  # uvloop has no Windows support
+        http="httptools",
+        reload=settings.debug
     )
@@ -4,24 +4,53 @@ try:
 except ImportError:
     SENTENCE_TRANSFORMERS_AVAILABLE = False
     SentenceTransformer = None
+
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+    ort = None
+    Tokenizer = None
     
 from backend.config import settings
 import logging
-from typing import List
+import os
+import re
+import numpy as np
+from bisect import bisect_left
+from typing import Iterator, List
 
 logger = logging.getLogger(__name__)
 
+# Characters chunk_text prefers to split after
+_SENT_BOUNDARY = re.compile(r"[.\n]")
+
 class EmbeddingService:
     """Service for generating text embeddings"""
     
     def __init__(self):
         self.model_name = settings.embedding_model
         self.model = None
+        self.session = None
+        self.tokenizer = None
         self._load_model()
     
     def _load_model(self):
-        """Load the embedding model"""
+        """Load the embedding model and bind the encode functions for it"""
+        # Encoders are bound once here so embed_text/embed_batch don't branch per call
+        self._encode_single = self._encode_unavailable
+        self._encode_batch = self._encode_unavailable
+        
         try:
+            # ONNX Runtime path (exported MiniLM, optionally int8-quantized)
+            if settings.embedding_onnx_path and ONNX_AVAILABLE:
+                self._load_onnx_model()
+                self._encode_single = lambda text: self._onnx_encode([text])[0]
+                self._encode_batch = self._onnx_encode
+                return
+            
             # TEMPORARILY DISABLED due to TensorFlow compatibility issues
             # RAG features will not work until this is re-enabled
             logger.warning("Embedding model disabled - RAG features unavailable")
@@ -32,6 +61,10 @@ class EmbeddingService:
             # if self.model_name.startswith('sentence-transformers/'):
             #     # Use Sentence Transformers
             #     self.model = SentenceTransformer(self.model_name)
+            #     self._encode_single = lambda text: self.model.encode(text, convert_to_numpy=True)
+            #     self._encode_batch = lambda texts: self.model.encode(
+            #         texts, convert_to_numpy=True, batch_size=64, show_progress_bar=False
+            #     )
             #     logger.info(f"Loaded embedding model: {self.model_name}")
             # elif settings.openai_api_key:
             #     # Use OpenAI embeddings (implement if needed)
@@ -43,6 +76,51 @@ class EmbeddingService:
             logger.error(f"Error loading embedding model: {str(e)}")
             raise
     
+    @staticmethod
+    def _encode_unavailable(texts):
+        """Encoder used when no embedding backend could be loaded"""
+        raise RuntimeError(
+            "No embedding model loaded: set EMBEDDING_ONNX_PATH and install onnxruntime and tokenizers"
+        )
+    
+    def _load_onnx_model(self):
+        """Load an ONNX-exported sentence-transformers model and its tokenizer"""
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = os.cpu_count() or 1
+        self.session = ort.InferenceSession(
+            settings.embedding_onnx_path,
+            sess_options=opts,
+            providers=["CPUExecutionProvider"]
+        )
+        self._onnx_inputs = {i.name for i in self.session.get_inputs()}
+        
+        tokenizer_path = settings.embedding_tokenizer_path or os.path.join(
+            os.path.dirname(settings.embedding_onnx_path), "tokenizer.json"
+        )
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_padding()
+        self.tokenizer.enable_truncation(max_length=256)
+        logger.info(f"Loaded ONNX embedding model: {settings.embedding_onnx_path}")
+    
+    def _onnx_encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts with one ONNX Runtime call, mean-pooled and L2-normalized"""
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._onnx_inputs:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        
+        last_hidden = self.session.run(None, feeds)[0]
+        
+        # Mean pooling over non-padding tokens
+        mask = attention_mask.astype(np.float32)
+        pooled = np.einsum("ijk,ij->ik", last_hidden, mask) / np.maximum(mask.sum(axis=1, keepdims=True), 1e-9)
+        
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.maximum(norms, 1e-12)
+    
     def embed_text(self, text: str) -> List[float]:
         """
         Generate embedding for a single text
@@ -54,13 +132,7 @@ class EmbeddingService:
             List of floats representing the embedding
         """
         try:
-            if isinstance(self.model, SentenceTransformer):
-                embedding = self.model.encode(text, convert_to_numpy=True)
-                return embedding.tolist()
-            else:
-                # OpenAI or other provider
-                raise NotImplementedError("OpenAI embeddings not yet implemented")
-                
+            return self._encode_single(text).tolist()
         except Exception as e:
             logger.error(f"Error generating embedding: {str(e)}")
             return []
@@ -76,17 +148,12 @@ class EmbeddingService:
             List of embeddings
         """
         try:
-            if isinstance(self.model, SentenceTransformer):
-                embeddings = self.model.encode(texts, convert_to_numpy=True)
-                return [emb.tolist() for emb in embeddings]
-            else:
-                raise NotImplementedError("Batch embeddings not yet implemented")
-                
+            return self._encode_batch(texts).tolist()
         except Exception as e:
             logger.error(f"Error generating batch embeddings: {str(e)}")
             return []
     
-    def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+    def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> Iterator[str]:
         """
         Split text into overlapping chunks
         
@@ -95,27 +162,24 @@ class EmbeddingService:
             chunk_size: Size of each chunk in characters
             overlap: Overlap between chunks
             
-        Returns:
-            List of text chunks
+        Yields:
+            Non-empty text chunks
         """
-        chunks = []
+        # Sentence boundaries found in a single scan, looked up per chunk by bisection
+        boundaries = [m.start() for m in _SENT_BOUNDARY.finditer(text)]
+        text_len = len(text)
         start = 0
         
-        while start < len(text):
+        while start < text_len:
             end = start + chunk_size
-            chunk = text[start:end]
             
             # Try to break at sentence boundary
-            if end < len(text):
-                last_period = chunk.rfind('.')
-                last_newline = chunk.rfind('\n')
-                break_point = max(last_period, last_newline)
-                
-                if break_point > chunk_size // 2:
-                    chunk = chunk[:break_point + 1]
-                    end = start + break_point + 1
+            if end < text_len:
+                i = bisect_left(boundaries, end) - 1
+                if i >= 0 and boundaries[i] - start > chunk_size // 2:
+                    end = boundaries[i] + 1
             
-            chunks.append(chunk.strip())
+            chunk = text[start:end].strip()
+            if chunk:
+                yield chunk
             start = end - overlap
-        
-        return [c for c in chunks if c]  # Filter empty chunks
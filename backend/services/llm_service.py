@@ -1,18 +1,59 @@
-from groq import Groq
+from groq import AsyncGroq
 from backend.config import settings
-import json
+import orjson
 import logging
 
 logger = logging.getLogger(__name__)
 
+_SYSTEM_MSG = {
+    "role": "system",
+    "content": """You are an expert SQL assistant that converts natural language to SQL queries.
+
+IMPORTANT GUIDELINES FOR CRUD OPERATIONS:
+1. For queries  mentioning "add", "create", "insert", or "new" → Generate INSERT statements
+2. For queries mentioning "update", "change", "modify", "set" → Generate UPDATE statements  
+3. For queries mentioning "delete", "remove", "drop" → Generate DELETE statements
+4. For queries mentioning "show", "list", "get", "find", "count", "select" → Generate SELECT statements
+
+EXAMPLES:
+- "Add a new user named John" → INSERT INTO users (name) VALUES ('John')
+- "Update user with id 1 set name to Alice" → UPDATE users SET name = 'Alice' WHERE id = 1
+- "Delete user where id = 5" → DELETE FROM users WHERE id = 5
+- "Show all users" → SELECT * FROM users
+
+Always include WHERE clauses for UPDATE and DELETE operations when possible.
+Return response as JSON with: sql, explanation, confidence (0.0-1.0)"""
+}
+
+_PROMPT_INSTRUCTIONS = """
+
+Instructions:
+- Generate the appropriate SQL statement based on user intent (SELECT, INSERT, UPDATE, DELETE)
+- For INSERT: include all necessary columns with appropriate values
+- For UPDATE/DELETE: always include WHERE clause when specific records are mentioned
+- Make sure table and column names come exactly from the provided schema
+- Use proper SQL syntax for PostgreSQL
+- Add a short one-line explanation of what this query does
+- Provide a confidence score (0.0 to 1.0) based on how well you understand the query
+
+Output format (JSON):
+{
+  "sql": "INSERT INTO ... / UPDATE ... / DELETE FROM ... / SELECT ...",
+  "explanation": "This query ...",
+  "confidence": 0.95
+}
+
+Return ONLY valid JSON, no additional text."""
+
 class LLMService:
     """Service for interacting with Llama 70B via GROQ API"""
     
     def __init__(self):
-        self.client = Groq(api_key=settings.groq_api_key)
+        self.client = AsyncGroq(api_key=settings.groq_api_key)
         self.model = settings.groq_model
+        self._fmt_cache = {}  # {schema signature: formatted schema text}
         
-    def generate_sql(
+    async def generate_sql(
         self, 
         user_query: str, 
         schema_info: dict, 
@@ -34,44 +75,26 @@ class LLMService:
             prompt = self._build_prompt(user_query, schema_info, context_docs)
             
             # Call GROQ API
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {
-                        "role": "system",
-                        "content": """You are an expert SQL assistant that converts natural language to SQL queries.
-
-IMPORTANT GUIDELINES FOR CRUD OPERATIONS:
-1. For queries  mentioning "add", "create", "insert", or "new" → Generate INSERT statements
-2. For queries mentioning "update", "change", "modify", "set" → Generate UPDATE statements  
-3. For queries mentioning "delete", "remove", "drop" → Generate DELETE statements
-4. For queries mentioning "show", "list", "get", "find", "count", "select" → Generate SELECT statements
-
-EXAMPLES:
-- "Add a new user named John" → INSERT INTO users (name) VALUES ('John')
-- "Update user with id 1 set name to Alice" → UPDATE users SET name = 'Alice' WHERE id = 1
-- "Delete user where id = 5" → DELETE FROM users WHERE id = 5
-- "Show all users" → SELECT * FROM users
-
-Always include WHERE clauses for UPDATE and DELETE operations when possible.
-Return response as JSON with: sql, explanation, confidence (0.0-1.0)"""
-                    },
+                    _SYSTEM_MSG,
                     {
                         "role": "user",
                         "content": prompt
                     }
                 ],
                 temperature=0.1,  # Low temperature for consistent SQL generation
-                max_tokens=1000,
+                max_tokens=400,  # JSON with one statement fits well within this
                 response_format={"type": "json_object"}
             )
             
             # Parse response
-            result = json.loads(response.choices[0].message.content)
+            result = orjson.loads(response.choices[0].message.content)
             
             if settings.log_queries:
-                logger.info(f"Generated SQL for query: {user_query[:100]}")
-                logger.debug(f"SQL: {result.get('sql', 'N/A')}")
+                logger.info("Generated SQL for query: %.100s", user_query)
+                logger.debug("SQL: %s", result.get('sql', 'N/A'))
             
             return {
                 "sql": result.get("sql", ""),
@@ -95,43 +118,36 @@ Return response as JSON with: sql, explanation, confidence (0.0-1.0)"""
         # Format schema information
         schema_text = self._format_schema(schema_info)
         
+        parts = [
+            "You are an expert assistant that converts natural language to SQL queries.\n\n",
+            "Database Schema:\n",
+            schema_text,
+            "\n"
+        ]
+        
         # Format context documents
-        context_text = ""
         if context_docs and settings.enable_rag:
-            context_text = "\n\nRelevant context from dataset:\n"
+            parts.append("\n\nRelevant context from dataset:\n")
             for i, doc in enumerate(context_docs[:settings.max_context_chunks], 1):
-                context_text += f"\n{i}. {doc.get('content', '')}"
+                parts.append(f"\n{i}. {doc.get('content', '')}")
         
-        prompt = f"""You are an expert assistant that converts natural language to SQL queries.
-
-Database Schema:
-{schema_text}
-{context_text}
-
-User Question: "{user_query}"
-
-Instructions:
-- Generate the appropriate SQL statement based on user intent (SELECT, INSERT, UPDATE, DELETE)
-- For INSERT: include all necessary columns with appropriate values
-- For UPDATE/DELETE: always include WHERE clause when specific records are mentioned
-- Make sure table and column names come exactly from the provided schema
-- Use proper SQL syntax for PostgreSQL
-- Add a short one-line explanation of what this query does
-- Provide a confidence score (0.0 to 1.0) based on how well you understand the query
-
-Output format (JSON):
-{{
-  "sql": "INSERT INTO ... / UPDATE ... / DELETE FROM ... / SELECT ...",
-  "explanation": "This query ...",
-  "confidence": 0.95
-}}
-
-Return ONLY valid JSON, no additional text."""
-
-        return prompt
+        parts.append(f'\n\nUser Question: "{user_query}"')
+        parts.append(_PROMPT_INSTRUCTIONS)
+        return "".join(parts)
     
     def _format_schema(self, schema_info: dict) -> str:
         """Format schema information for prompt"""
+        key = tuple(
+            (table_name, tuple(
+                (col['column_name'], col['data_type'], col.get('is_nullable'), col.get('primary_key'))
+                for col in columns
+            ))
+            for table_name, columns in schema_info.items()
+        )
+        cached = self._fmt_cache.get(key)
+        if cached is not None:
+            return cached
+        
         schema_lines = []
         
         for table_name, columns in schema_info.items():
@@ -146,12 +162,18 @@ Return ONLY valid JSON, no additional text."""
                     col_info += " PRIMARY KEY"
                 schema_lines.append(col_info)
         
-        return "\n".join(schema_lines)
+        schema_text = "\n".join(schema_lines)
+        
+        # Schemas rarely change; keep the cache from growing without bound
+        if len(self._fmt_cache) >= 32:
+            self._fmt_cache.clear()
+        self._fmt_cache[key] = schema_text
+        return schema_text
     
-    def explain_query(self, sql: str) -> str:
+    async def explain_query(self, sql: str) -> str:
         """Get a human-readable explanation of a SQL query"""
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {
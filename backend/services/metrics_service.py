@@ -0,0 +1,143 @@
+"""
+Pre-computed metrics for common aggregate questions
+Answers questions like "how many users are there" from a periodically refreshed
+cache instead of going through the LLM
+"""
+import asyncio
+import logging
+import re
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# name -> (sql, table it reads, ttl seconds, question pattern matched against the normalized query)
+# A metric is only served when its table exists in the connected database
+REGISTERED_METRICS = {
+    "total_users": (
+        "SELECT COUNT(*) AS count FROM users",
+        "users",
+        60,
+        r"(how many|count( all)?( the)?|total( number of)?|number of) users( are there| do we have)?( in total)?",
+    ),
+    "total_products": (
+        "SELECT COUNT(*) AS count FROM products",
+        "products",
+        60,
+        r"(how many|count( all)?( the)?|total( number of)?|number of) products( are there| do we have)?( in total)?",
+    ),
+    "total_orders": (
+        "SELECT COUNT(*) AS count FROM orders",
+        "orders",
+        60,
+        r"(how many|count( all)?( the)?|total( number of)?|number of) orders( are there| do we have)?( in total)?",
+    ),
+    "total_reviews": (
+        "SELECT COUNT(*) AS count FROM reviews",
+        "reviews",
+        60,
+        r"(how many|count( all)?( the)?|total( number of)?|number of) reviews( are there| do we have)?( in total)?",
+    ),
+    "total_revenue": (
+        "SELECT SUM(total) AS total_revenue FROM orders",
+        "orders",
+        60,
+        r"(what is |what's |show( me)? )?(the )?total revenue",
+    ),
+}
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", query.lower().strip().rstrip("?.!"))
+
+class MetricsService:
+    """Serves registered aggregate metrics from a refreshed in-memory cache"""
+    
+    def __init__(self, db_service):
+        self.db_service = db_service
+        self.patterns = {}  # Active metrics only, filled by start()
+        self.cache = {}  # {metric name: (expires_at, rows)}
+        self._refresh_task: Optional[asyncio.Task] = None
+    
+    def match(self, query: str) -> Optional[str]:
+        """Return the active metric name answering this question, if any"""
+        normalized = normalize_query(query)
+        for name, pattern in self.patterns.items():
+            if pattern.fullmatch(normalized):
+                return name
+        return None
+    
+    async def get(self, name: str) -> Optional[dict]:
+        """
+        Get a metric result, refreshing it first if expired
+        
+        Args:
+            name: Registered metric name
+            
+        Returns:
+            dict with sql, rows and count, or None if the metric failed
+        """
+        entry = self.cache.get(name)
+        if entry is None or entry[0] <= time.monotonic():
+            await self.refresh(name)
+            entry = self.cache.get(name)
+            if entry is None:
+                return None
+        
+        rows = entry[1]
+        return {
+            "sql": REGISTERED_METRICS[name][0],
+            "rows": rows,
+            "count": len(rows)
+        }
+    
+    async def refresh(self, name: str):
+        """Recompute a single metric"""
+        sql, _, ttl, _ = REGISTERED_METRICS[name]
+        result = await self.db_service.execute_query(sql)
+        if result['success']:
+            self.cache[name] = (time.monotonic() + ttl, result['rows'])
+        else:
+            self.cache.pop(name, None)
+            logger.warning("Failed to refresh metric %s: %s", name, result.get('error'))
+    
+    async def refresh_all(self):
+        """Recompute every active metric concurrently"""
+        await asyncio.gather(*(self.refresh(name) for name in self.patterns))
+    
+    async def start(self):
+        """Activate metrics whose table exists, compute them and keep them fresh in the background"""
+        schema = await self.db_service.get_schema()
+        self.patterns = {
+            name: re.compile(pattern)
+            for name, (_, table, _, pattern) in REGISTERED_METRICS.items()
+            if table in schema
+        }
+        skipped = len(REGISTERED_METRICS) - len(self.patterns)
+        if skipped:
+            logger.info("Skipping %d metrics whose tables are not in the database", skipped)
+        if not self.patterns:
+            return
+        
+        await self.refresh_all()
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+        logger.info("Pre-computed %d/%d metrics", len(self.cache), len(self.patterns))
+    
+    async def stop(self):
+        """Stop the background refresh loop"""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+    
+    def invalidate(self):
+        """Drop cached values after data changes"""
+        self.cache.clear()
+    
+    async def _refresh_loop(self):
+        interval = min(REGISTERED_METRICS[name][2] for name in self.patterns)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                logger.error("Metric refresh failed: %s", e)
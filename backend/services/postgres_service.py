@@ -4,17 +4,26 @@ Uses asyncpg to connect directly to PostgreSQL database, bypassing RPC issues
 """
 import asyncpg
 import logging
+import re
+import time
 from typing import List, Dict, Optional
 from backend.config import settings
+from backend.utils.sql_safety import DDL_KEYWORDS
 
 logger = logging.getLogger(__name__)
 
+# Read statements (plain or CTE), skipping leading whitespace, parentheses and comments
+_READ_RE = re.compile(
+    r"^(?:\s|\(|--[^\n]*(?:\n|$)|/\*(?:[^*]|\*(?!/))*\*/)*(?:SELECT|WITH|VALUES|TABLE)\b",
+    re.IGNORECASE
+)
+
 class PostgresService:
     """Service for direct PostgreSQL connection to Supabase"""
     
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
-        self.schema_cache = {}
+        self.schema_cache = {}  # {table_name or "__all__": (timestamp, schema)}
         logger.info("[POSTGRES] Initializing Direct PostgreSQL Service")
         
     async def connect(self):
@@ -25,8 +34,10 @@ class PostgresService:
         try:
             self.pool = await asyncpg.create_pool(
                 settings.database_url,
-               min_size=1,
-                max_size=10,
+                min_size=settings.db_pool_min,
+                max_size=settings.db_pool_max,
+                # asyncpg prepares every fetch() and reuses the plan for repeated SQL text
+                statement_cache_size=settings.db_statement_cache_size,
                 command_timeout=60
             )
             logger.info("[POSTGRES] Connection pool created successfully")
@@ -41,6 +52,11 @@ class PostgresService:
             await self.pool.close()
             logger.info("[POSTGRES] Connection pool closed")
     
+    def invalidate_schema_cache(self):
+        """Drop cached schema so the next get_schema call hits PostgreSQL"""
+        self.schema_cache.clear()
+        logger.info("[POSTGRES] Schema cache invalidated")
+    
     async def execute_query(self, sql: str) -> dict:
         """
         Execute SQL query directly against PostgreSQL
@@ -57,18 +73,36 @@ class PostgresService:
         try:
             logger.info(f"[POSTGRES] Executing query: {sql[:100]}...")
             
+            limit = settings.max_rows_affected
+            is_read = bool(_READ_RE.match(sql))
+            
             async with self.pool.acquire() as conn:
-                # Execute query
-                rows = await conn.fetch(sql)
+                if is_read:
+                    # The SQL runs unchanged through a cursor; PostgreSQL stops
+                    # producing rows one past the limit, whatever the query's form
+                    async with conn.transaction():
+                        cursor = await conn.cursor(sql)
+                        rows = await cursor.fetch(limit + 1)
+                else:
+                    rows = await conn.fetch(sql)
+                
+                truncated = is_read and len(rows) > limit
+                if truncated:
+                    rows = rows[:limit]
                 
-                # Convert asyncpg.Record to dict
-                result_rows = [dict(row) for row in rows]
+                # Every record shares the same columns, so resolve the keys once
+                keys = list(rows[0].keys()) if rows else []
                 
-                logger.info(f"[POSTGRES] Query successful! Returned {len(result_rows)} rows")
+                logger.info(f"[POSTGRES] Query successful! Returned {len(rows)} rows")
+                
+                # Schema changes make the cached schema stale
+                if sql.lstrip().upper().startswith(DDL_KEYWORDS):
+                    self.invalidate_schema_cache()
                 
                 return {
-                    "rows": result_rows,
-                    "count": len(result_rows),
+                    "rows": [dict(zip(keys, row.values())) for row in rows],
+                    "count": len(rows),
+                    "truncated": truncated,
                     "success": True
                 }
                 
@@ -101,32 +135,55 @@ class PostgresService:
         Returns:
             dict containing schema information
         """
+        cache_key = table_name or "__all__"
+        
+        if settings.enable_schema_cache and cache_key in self.schema_cache:
+            cached_at, cached_schema = self.schema_cache[cache_key]
+            if time.monotonic() - cached_at < settings.schema_ttl:
+                return cached_schema
+        
         if not self.pool:
             await self.connect()
             
         try:
-            # Query to get all tables and columns
+            # Query to get all tables and columns, with primary key membership
             schema_query = """
             SELECT 
                 t.table_name,
                 c.column_name,
                 c.data_type,
                 c.is_nullable,
-                c.column_default
+                c.column_default,
+                pk.column_name IS NOT NULL AS is_primary_key
             FROM information_schema.tables t
             JOIN information_schema.columns c 
-                ON t.table_name = c.table_name
+                ON c.table_schema = t.table_schema
+                AND c.table_name = t.table_name
+            LEFT JOIN (
+                SELECT k.table_schema, k.table_name, k.column_name
+                FROM information_schema.table_constraints tc
+                JOIN information_schema.key_column_usage k
+                    ON k.constraint_schema = tc.constraint_schema
+                    AND k.constraint_name = tc.constraint_name
+                WHERE tc.constraint_type = 'PRIMARY KEY'
+            ) pk
+                ON pk.table_schema = c.table_schema
+                AND pk.table_name = c.table_name
+                AND pk.column_name = c.column_name
             WHERE t.table_schema = 'public'
                 AND t.table_type = 'BASE TABLE'
             """
             
+            # Parameterized so the name can't inject SQL and the plan is reusable
+            params = []
             if table_name:
-                schema_query += f" AND t.table_name = '{table_name}'"
+                schema_query += " AND t.table_name = $1"
+                params.append(table_name)
                 
             schema_query += " ORDER BY t.table_name, c.ordinal_position"
             
             async with self.pool.acquire() as conn:
-                rows = await conn.fetch(schema_query)
+                rows = await conn.fetch(schema_query, *params)
             
             # Organize schema by table - return columns list directly (not wrapped in dict)
             schema = {}
@@ -140,9 +197,12 @@ class PostgresService:
                     'data_type': row['data_type'],
                     'is_nullable': 'YES' if row['is_nullable'] == 'YES' else 'NO',
                     'column_default': row['column_default'],
-                    'primary_key': False  # Can be enhanced later
+                    'primary_key': row['is_primary_key']
                 })
             
+            if settings.enable_schema_cache:
+                self.schema_cache[cache_key] = (time.monotonic(), schema)
+            
             logger.info(f"[POSTGRES] Retrieved schema for {len(schema)} tables")
             return schema
             
@@ -1,17 +1,178 @@
 from backend.services.supabase_service import SupabaseService
 from backend.services.embedding_service import EmbeddingService
 from backend.config import settings
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict
+import sqlite3
+import time
+import numpy as np
+from collections import OrderedDict
+from itertools import islice
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    """Yield successive lists of up to size items"""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+class SemanticCache:
+    """Retrieval results keyed by query embedding, matched by cosine similarity"""
+    
+    def __init__(self, capacity: int, threshold: float, ttl: float):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self._matrix: Optional[np.ndarray] = None  # One normalized embedding per row
+        self._documents: List[List[dict]] = []
+        self._created: List[float] = []
+        self._last_used: List[float] = []
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+    
+    def get(self, embedding: List[float]) -> Optional[List[dict]]:
+        """Return cached documents for a sufficiently similar query"""
+        if self._matrix is None:
+            return None
+        
+        # One vectorized similarity sweep over every cached query; expired
+        # entries can't win, so a fresh match behind a stale duplicate is found
+        scores = self._matrix @ self._normalize(embedding)
+        now = time.monotonic()
+        scores[now - np.asarray(self._created) >= self.ttl] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        
+        self._last_used[best] = now
+        return self._documents[best]
+    
+    def put(self, embedding: List[float], documents: List[dict]):
+        """Cache documents in an expired slot, a new row, or the least recently used slot when full"""
+        vector = self._normalize(embedding)
+        now = time.monotonic()
+        expired = [i for i, created in enumerate(self._created) if now - created >= self.ttl]
+        
+        if self._matrix is None:
+            self._matrix = vector[np.newaxis, :]
+        elif not expired and len(self._documents) < self.capacity:
+            self._matrix = np.vstack([self._matrix, vector])
+        else:
+            slot = expired[0] if expired else int(np.argmin(self._last_used))
+            self._matrix[slot] = vector
+            self._documents[slot] = documents
+            self._created[slot] = now
+            self._last_used[slot] = now
+            return
+        
+        self._documents.append(documents)
+        self._created.append(now)
+        self._last_used.append(now)
+    
+    def clear(self):
+        self._matrix = None
+        self._documents = []
+        self._created = []
+        self._last_used = []
+
+class ChunkEmbeddingStore:
+    """Chunk embeddings keyed by SHA-256 of the content, persisted in SQLite across runs"""
+    
+    # Max placeholders per lookup (SQLite's default variable limit is 999)
+    _LOOKUP_BATCH = 500
+    
+    def __init__(self, path: str, model: str):
+        self.model = model
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "digest BLOB NOT NULL, model TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (digest, model))"
+        )
+    
+    def get_many(self, digests: List[bytes]) -> Dict[bytes, List[float]]:
+        """Return stored embeddings for the digests that have one"""
+        found = {}
+        for batch in _batched(digests, self._LOOKUP_BATCH):
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT digest, vector FROM embeddings WHERE model = ? AND digest IN ({placeholders})",
+                (self.model, *batch)
+            )
+            for digest, vector in rows:
+                found[digest] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+    
+    def put_many(self, embeddings: Dict[bytes, List[float]]):
+        """Store embeddings as float32 blobs"""
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (digest, model, vector) VALUES (?, ?, ?)",
+                (
+                    (digest, self.model, np.asarray(embedding, dtype=np.float32).tobytes())
+                    for digest, embedding in embeddings.items()
+                )
+            )
+
 class RAGService:
     """Retrieval-Augmented Generation service"""
     
     def __init__(self):
         self.supabase = SupabaseService()
         self.embedding = EmbeddingService()
+        self._embedding_cache = OrderedDict()  # {normalized query: float16 embedding}, LRU order
+        self._semantic_cache = SemanticCache(
+            capacity=settings.semantic_cache_size,
+            threshold=settings.semantic_cache_threshold,
+            ttl=settings.semantic_cache_ttl
+        )
+        self._chunk_store = (
+            ChunkEmbeddingStore(settings.embedding_store_path, settings.embedding_model)
+            if settings.embedding_store_path else None
+        )
+    
+    def _embed_query(self, user_query: str) -> Optional[List[float]]:
+        """Embed a query, reusing the result for repeated questions"""
+        key = user_query.strip().lower()
+        cached = self._embedding_cache.get(key)
+        if cached is not None:
+            self._embedding_cache.move_to_end(key)
+            return cached.astype(np.float32).tolist()
+        
+        embedding = self.embedding.embed_text(user_query)
+        if embedding:
+            # float16 halves the memory of float32 and is ample precision for similarity search
+            self._embedding_cache[key] = np.asarray(embedding, dtype=np.float16)
+            if len(self._embedding_cache) > settings.embedding_cache_capacity:
+                self._embedding_cache.popitem(last=False)
+        return embedding
+    
+    def _embed_unique(self, chunks: List[str]) -> List[List[float]]:
+        """Embed each distinct chunk once and expand the results back to chunk order"""
+        digests = [hashlib.sha256(chunk.encode()).digest() for chunk in chunks]
+        unique = dict(zip(digests, chunks))
+        
+        # Chunks embedded in an earlier run are read back instead of re-embedded
+        by_digest = self._chunk_store.get_many(list(unique)) if self._chunk_store else {}
+        missing = [digest for digest in unique if digest not in by_digest]
+        
+        if missing:
+            embeddings = self.embedding.embed_batch([unique[digest] for digest in missing])
+            if len(embeddings) != len(missing):
+                return []
+            
+            new = dict(zip(missing, embeddings))
+            if self._chunk_store:
+                self._chunk_store.put_many(new)
+            by_digest.update(new)
+        
+        return [by_digest[digest] for digest in digests]
     
     async def retrieve_context(self, user_query: str) -> List[dict]:
         """
@@ -28,17 +189,27 @@ class RAGService:
         
         try:
             # Generate query embedding
-            query_embedding = self.embedding.embed_text(user_query)
+            query_embedding = self._embed_query(user_query)
             
             if not query_embedding:
                 logger.warning("Failed to generate query embedding")
                 return []
             
+            # Reuse results from a near-identical earlier question
+            documents = self._semantic_cache.get(query_embedding)
+            if documents is not None:
+                logger.info(f"Semantic cache hit ({len(documents)} context documents)")
+                return documents
+            
             # Search for similar documents
             documents = await self.supabase.search_documents(
                 query_embedding=query_embedding,
                 limit=settings.max_context_chunks
             )
+            # search_documents returns [] on errors too, so don't pin an empty
+            # result on every paraphrase for the cache TTL
+            if documents:
+                self._semantic_cache.put(query_embedding, documents)
             
             logger.info(f"Retrieved {len(documents)} context documents")
             return documents
@@ -63,30 +234,66 @@ class RAGService:
             bool indicating success
         """
         try:
-            # Chunk the document
-            chunks = self.embedding.chunk_text(content)
+            success_count, chunk_count = await self._ingest_chunks(
+                (chunk, metadata or {}) for chunk in self.embedding.chunk_text(content)
+            )
             
-            logger.info(f"Split document into {len(chunks)} chunks")
+            logger.info(f"Stored {success_count}/{chunk_count} chunks")
+            return success_count == chunk_count
             
-            # Generate embeddings for each chunk
-            embeddings = self.embedding.embed_batch(chunks)
+        except Exception as e:
+            logger.error(f"Error ingesting document: {str(e)}")
+            return False
+    
+    async def ingest_documents(
+        self,
+        contents: List[str],
+        metadatas: List[dict] = None
+    ) -> int:
+        """
+        Ingest many small documents with batched embedding and storage
+        
+        Args:
+            contents: Document contents
+            metadatas: Metadata per document (same order as contents)
             
-            # Store each chunk with its embedding
-            success_count = 0
-            for chunk, embedding in zip(chunks, embeddings):
-                if await self.supabase.store_document(
-                    content=chunk,
-                    embedding=embedding,
-                    metadata=metadata
-                ):
-                    success_count += 1
+        Returns:
+            Number of chunks stored
+        """
+        metadatas = metadatas or [{}] * len(contents)
+        try:
+            success_count, chunk_count = await self._ingest_chunks(
+                (chunk, metadata or {})
+                for content, metadata in zip(contents, metadatas)
+                for chunk in self.embedding.chunk_text(content)
+            )
             
-            logger.info(f"Stored {success_count}/{len(chunks)} chunks")
-            return success_count == len(chunks)
+            logger.info(f"Stored {success_count}/{chunk_count} chunks from {len(contents)} documents")
+            return success_count
             
         except Exception as e:
-            logger.error(f"Error ingesting document: {str(e)}")
-            return False
+            logger.error(f"Error ingesting documents: {str(e)}")
+            return 0
+    
+    async def _ingest_chunks(self, chunks: Iterable[Tuple[str, dict]]) -> Tuple[int, int]:
+        """Embed and store (chunk, metadata) pairs one window at a time; returns (stored, total)"""
+        chunk_count = 0
+        success_count = 0
+        
+        # Chunk, embed and store one window at a time so memory stays bounded
+        for window in _batched(chunks, settings.ingest_batch_size):
+            chunk_count += len(window)
+            embeddings = self._embed_unique([chunk for chunk, _ in window])
+            rows = [
+                {'content': chunk, 'embedding': embedding, 'metadata': metadata}
+                for (chunk, metadata), embedding in zip(window, embeddings)
+            ]
+            success_count += await self.supabase.store_documents_bulk(rows)
+        
+        # New documents may change what earlier questions should retrieve
+        self._semantic_cache.clear()
+        
+        return success_count, chunk_count
     
     async def get_table_context(self, table_names: List[str]) -> List[dict]:
         """
@@ -98,20 +305,29 @@ class RAGService:
         Returns:
             List of context documents with sample data
         """
-        context = []
+        semaphore = asyncio.Semaphore(8)
+        
+        async def fetch_sample(table_name: str) -> List[dict]:
+            async with semaphore:
+                return await self.supabase.get_table_sample(table_name, limit=3)
         
-        for table_name in table_names:
-            try:
-                samples = await self.supabase.get_table_sample(table_name, limit=3)
-                
-                if samples:
-                    context.append({
-                        'content': f"Sample data from {table_name}: {samples}",
-                        'table': table_name,
-                        'type': 'sample_data'
-                    })
-                    
-            except Exception as e:
-                logger.error(f"Error getting table context for {table_name}: {str(e)}")
+        # Fetch all samples concurrently instead of one table at a time
+        results = await asyncio.gather(
+            *(fetch_sample(table_name) for table_name in table_names),
+            return_exceptions=True
+        )
+        
+        context = []
+        for table_name, samples in zip(table_names, results):
+            if isinstance(samples, Exception):
+                logger.error(f"Error getting table context for {table_name}: {str(samples)}")
+                continue
+            
+            if samples:
+                context.append({
+                    'content': f"Sample data from {table_name}: {samples}",
+                    'table': table_name,
+                    'type': 'sample_data'
+                })
         
         return context
@@ -1,22 +1,123 @@
 from supabase import create_client, Client
+import asyncio
+import httpx
 from backend.config import settings
+from backend.utils.sql_safety import DDL_KEYWORDS
 import logging
-from typing import List, Dict, Optional
+import time
+import numpy as np
+import orjson
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+
+try:
+    import simsimd
+    SIMSIMD_AVAILABLE = True
+except ImportError:
+    SIMSIMD_AVAILABLE = False
+    simsimd = None
 
 logger = logging.getLogger(__name__)
 
+# Minimum cosine similarity for a document to count as a match
+MATCH_THRESHOLD = 0.7
+
+# Rows fetched per request when loading documents for client-side search
+DOCUMENT_PAGE_SIZE = 1000
+
+# PostgREST error code for a function that isn't in the schema cache
+RPC_NOT_FOUND_CODE = "PGRST202"
+
+# Audit log batching: max rows per insert, max seconds a row waits, max rows buffered
+LOG_BATCH_SIZE = 100
+LOG_FLUSH_INTERVAL = 2.0
+LOG_QUEUE_SIZE = 10000
+
+# Known schema for the demo tables, built once at import
+_STATIC_SCHEMA = {
+    "users": [
+        {"column_name": "id", "data_type": "bigint", "is_nullable": "NO"},
+        {"column_name": "name", "data_type": "text", "is_nullable": "YES"},
+        {"column_name": "email", "data_type": "text", "is_nullable": "YES"},
+        {"column_name": "role", "data_type": "text", "is_nullable": "YES"},
+        {"column_name": "created_at", "data_type": "timestamp", "is_nullable": "YES"}
+    ],
+    "products": [
+        {"column_name": "id", "data_type": "bigint", "is_nullable": "NO"},
+        {"column_name": "name", "data_type": "text", "is_nullable": "YES"},
+        {"column_name": "description", "data_type": "text", "is_nullable": "YES"},
+        {"column_name": "price", "data_type": "numeric", "is_nullable": "YES"},
+        {"column_name": "category", "data_type": "text", "is_nullable": "YES"},
+        {"column_name": "created_at", "data_type": "timestamp", "is_nullable": "YES"}
+    ],
+    "orders": [
+        {"column_name": "id", "data_type": "bigint", "is_nullable": "NO"},
+        {"column_name": "user_id", "data_type": "bigint", "is_nullable": "YES"},
+        {"column_name": "status", "data_type": "text", "is_nullable": "YES"},
+        {"column_name": "total", "data_type": "numeric", "is_nullable": "YES"},
+        {"column_name": "created_at", "data_type": "timestamp", "is_nullable": "YES"}
+    ],
+    "order_items": [
+        {"column_name": "id", "data_type": "bigint", "is_nullable": "NO"},
+        {"column_name": "order_id", "data_type": "bigint", "is_nullable": "YES"},
+        {"column_name": "product_id", "data_type": "bigint", "is_nullable": "YES"},
+        {"column_name": "quantity", "data_type": "integer", "is_nullable": "YES"},
+        {"column_name": "price", "data_type": "numeric", "is_nullable": "YES"}
+    ],
+    "reviews": [
+        {"column_name": "id", "data_type": "bigint", "is_nullable": "NO"},
+        {"column_name": "product_id", "data_type": "bigint", "is_nullable": "YES"},
+        {"column_name": "user_id", "data_type": "bigint", "is_nullable": "YES"},
+        {"column_name": "rating", "data_type": "integer", "is_nullable": "YES"},
+        {"column_name": "comment", "data_type": "text", "is_nullable": "YES"},
+        {"column_name": "created_at", "data_type": "timestamp", "is_nullable": "YES"}
+    ]
+}
+
+def _quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantize each row to int8 with its own scale, so row ~= q * scale"""
+    scale = np.maximum(np.abs(vectors).max(axis=-1, keepdims=True), 1e-12) / 127.0
+    quantized = np.rint(vectors / scale).astype(np.int8)
+    return quantized, scale.astype(np.float32).squeeze(-1)
+
+@lru_cache(maxsize=None)
+def get_supabase_client() -> Client:
+    """
+    Process-wide Supabase client
+    
+    The client keeps one persistent HTTP session for PostgREST, so sharing it
+    lets every service reuse the same keep-alive connections.
+    """
+    return create_client(settings.supabase_url, settings.supabase_service_role_key)
+
 class SupabaseService:
-    """Service for interacting with Supabase database"""
+    """
+    Service for interacting with Supabase database
+    
+    supabase-py is synchronous, so every request runs in a worker thread
+    (asyncio.to_thread) to keep the event loop free.
+    """
     
     def __init__(self):
-        logger.info("[STARTUP] Initializing SupabaseService with debug logging enabled")
-        self.client: Client = create_client(
-            settings.supabase_url,
-            settings.supabase_service_role_key
-        )
-        self.schema_cache = {}
-        logger.info(f"[STARTUP] Supabase URL: {settings.supabase_url[:50]}...")
-        logger.info(f"[STARTUP] Service key configured: {bool(settings.supabase_service_role_key)}")
+        logger.debug("[STARTUP] Initializing SupabaseService")
+        self.client: Client = get_supabase_client()
+        self.schema_cache = {}  # {table_name or "__all__": (timestamp, schema)}
+        self._rpc_available: Optional[bool] = None  # execute_safe_query deployed; None until first call
+        self._match_rpc_missing = False  # match_documents RPC not deployed
+        self._doc_index: Optional[Tuple[np.ndarray, np.ndarray, List[dict]]] = None  # (int8 embeddings, scales, documents)
+        self._log_queue: Optional[asyncio.Queue] = None  # Set while the log flusher runs
+        self._log_task: Optional[asyncio.Task] = None
+        
+        # Document writes go straight to PostgREST over one keep-alive HTTP client
+        self._documents_url = f"{settings.supabase_url.rstrip('/')}/rest/v1/documents"
+        self._rest_headers = {
+            "apikey": settings.supabase_service_role_key,
+            "Authorization": f"Bearer {settings.supabase_service_role_key}",
+            "Content-Type": "application/json",
+        }
+        self._http: Optional[httpx.AsyncClient] = None
+        logger.debug("[STARTUP] Supabase URL: %.50s...", settings.supabase_url)
+        logger.debug("[STARTUP] Service key configured: %s", bool(settings.supabase_service_role_key))
         
         
     async def execute_query(self, sql: str) -> dict:
@@ -29,19 +130,25 @@ class SupabaseService:
         Returns:
             dict with rows, count, and metadata
         """
+        # Known to be missing: don't repeat a request that will fail
+        if self._rpc_available is False:
+            return self._rpc_missing_result()
+        
         try:
-            # Debug logging
-            logger.info(f"[DEBUG] Attempting RPC call to Supabase")
-            logger.info(f"[DEBUG] Supabase URL: {settings.supabase_url[:50]}...")
-            logger.info(f"[DEBUG] Service Key exists: {bool(settings.supabase_service_role_key)}")
-            logger.info(f"[DEBUG] SQL Query: {sql[:100]}...")
-            logger.info(f"[DEBUG] Calling execute_safe_query with params: {{'query_text': sql[:50]}}")
+            logger.debug("Calling execute_safe_query RPC: %.100s", sql)
             
             # Execute query using Supabase RPC
-            result = self.client.rpc('execute_safe_query', {'query_text': sql}).execute()
+            result = await asyncio.to_thread(
+                self.client.rpc('execute_safe_query', {'query_text': sql}).execute
+            )
+            
+            self._rpc_available = True
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("RPC call succeeded, result data: %.200s", result.data)
             
-            logger.info(f"[DEBUG] RPC call SUCCESS! Data type: {type(result.data)}")
-            logger.info(f"[DEBUG] Result data: {str(result.data)[:200]}...")
+            # Schema changes make the cached schema stale
+            if sql.lstrip().upper().startswith(DDL_KEYWORDS):
+                self.invalidate_schema_cache()
             
             return {
                 "rows": result.data if result.data else [],
@@ -53,21 +160,15 @@ class SupabaseService:
             error_msg = str(e)
             error_type = type(e).__name__
             
-            # Enhanced error logging
-            logger.error(f"[DEBUG] RPC call FAILED!")
-            logger.error(f"[DEBUG] Error type: {error_type}")
-            logger.error(f"[DEBUG] Error message: {error_msg}")
-            logger.error(f"[DEBUG] Full exception: {repr(e)}")
+            logger.error("RPC call failed (%s): %s", error_type, error_msg)
+            logger.debug("Full exception: %r", e)
             
-            # Return mock success for testing CRUD confirmation flow
-            # In production, you'd want to handle this differently
-            if "PGRST202" in error_msg or "execute_safe_query" in error_msg:
+            # Only PostgREST's "function not found" means the RPC isn't deployed; errors
+            # raised inside execute_safe_query (syntax, permissions, constraints) are real
+            if getattr(e, 'code', None) == RPC_NOT_FOUND_CODE:
                 logger.info("RPC function not available - returning mock success for CRUD testing")
-                return {
-                    "rows": [{"message": "Query would execute here (RPC function not configured)"}],
-                    "count": 1,
-                    "success": True
-                }
+                self._rpc_available = False
+                return self._rpc_missing_result()
             
             return {
                 "rows": [],
@@ -76,6 +177,29 @@ class SupabaseService:
                 "error": error_msg
             }
     
+    @staticmethod
+    def _rpc_missing_result() -> dict:
+        """
+        Mock success for testing the CRUD confirmation flow without the RPC
+        
+        In production, you'd want to handle this differently
+        """
+        return {
+            "rows": [{"message": "Query would execute here (RPC function not configured)"}],
+            "count": 1,
+            "success": True
+        }
+    
+    def refresh_rpc_availability(self):
+        """Forget the cached RPC probe so the next query tries execute_safe_query again"""
+        self._rpc_available = None
+        self._match_rpc_missing = False
+    
+    def invalidate_schema_cache(self):
+        """Drop cached schema so the next get_schema call rebuilds it"""
+        self.schema_cache.clear()
+        logger.info("Schema cache invalidated")
+    
     async def get_schema(self, table_name: Optional[str] = None) -> dict:
         """
         Get database schema information
@@ -89,62 +213,23 @@ class SupabaseService:
         cache_key = table_name or "__all__"
         
         if settings.enable_schema_cache and cache_key in self.schema_cache:
-            return self.schema_cache[cache_key]
+            cached_at, cached_schema = self.schema_cache[cache_key]
+            if time.monotonic() - cached_at < settings.schema_ttl:
+                return cached_schema
         
         try:
             # Simplified approach: return known schema for our tables
             # This avoids needing RPC functions and works immediately
-            schema = {
-                "users": [
-                    {"column_name": "id", "data_type": "bigint", "is_nullable": "NO"},
-                    {"column_name": "name", "data_type": "text", "is_nullable": "YES"},
-                    {"column_name": "email", "data_type": "text", "is_nullable": "YES"},
-                    {"column_name": "role", "data_type": "text", "is_nullable": "YES"},
-                    {"column_name": "created_at", "data_type": "timestamp", "is_nullable": "YES"}
-                ],
-                "products": [
-                    {"column_name": "id", "data_type": "bigint", "is_nullable": "NO"},
-                    {"column_name": "name", "data_type": "text", "is_nullable": "YES"},
-                    {"column_name": "description", "data_type": "text", "is_nullable": "YES"},
-                    {"column_name": "price", "data_type": "numeric", "is_nullable": "YES"},
-                    {"column_name": "category", "data_type": "text", "is_nullable": "YES"},
-                    {"column_name": "created_at", "data_type": "timestamp", "is_nullable": "YES"}
-                ],
-                "orders": [
-                    {"column_name": "id", "data_type": "bigint", "is_nullable": "NO"},
-                    {"column_name": "user_id", "data_type": "bigint", "is_nullable": "YES"},
-                    {"column_name": "status", "data_type": "text", "is_nullable": "YES"},
-                    {"column_name": "total", "data_type": "numeric", "is_nullable": "YES"},
-                    {"column_name": "created_at", "data_type": "timestamp", "is_nullable": "YES"}
-                ],
-                "order_items": [
-                    {"column_name": "id", "data_type": "bigint", "is_nullable": "NO"},
-                    {"column_name": "order_id", "data_type": "big int", "is_nullable": "YES"},
-                    {"column_name": "product_id", "data_type": "bigint", "is_nullable": "YES"},
-                    {"column_name": "quantity", "data_type": "integer", "is_nullable": "YES"},
-                    {"column_name": "price", "data_type": "numeric", "is_nullable": "YES"}
-                ],
-                "reviews": [
-                    {"column_name": "id", "data_type": "bigint", "is_nullable": "NO"},
-                    {"column_name": "product_id", "data_type": "bigint", "is_nullable": "YES"},
-                    {"column_name": "user_id", "data_type": "bigint", "is_nullable": "YES"},
-                    {"column_name": "rating", "data_type": "integer", "is_nullable": "YES"},
-                    {"column_name": "comment", "data_type": "text", "is_nullable": "YES"},
-                    {"column_name": "created_at", "data_type": "timestamp", "is_nullable": "YES"}
-                ]
-            }
-            
-            if table_name:
-                schema = {table_name: schema.get(table_name, [])}
+            schema = {table_name: _STATIC_SCHEMA.get(table_name, [])} if table_name else _STATIC_SCHEMA
             
             if settings.enable_schema_cache:
-                self.schema_cache[cache_key] = schema
+                self.schema_cache[cache_key] = (time.monotonic(), schema)
             
-            logger.info(f"Schema fetched for {len(schema)} tables")
+            logger.info("Schema fetched for %d tables", len(schema))
             return schema
             
         except Exception as e:
-            logger.error(f"Error fetching schema: {str(e)}")
+            logger.error("Error fetching schema: %s", e)
             # Return empty schema rather than failing
             return {}
     
@@ -164,21 +249,103 @@ class SupabaseService:
             List of matching documents
         """
         try:
-            result = self.client.rpc(
-                'match_documents',
-                {
-                    'query_embedding': query_embedding,
-                    'match_threshold': 0.7,
-                    'match_count': limit
-                }
-            ).execute()
+            if self._match_rpc_missing:
+                return await self._search_documents_local(query_embedding, limit)
+            
+            result = await asyncio.to_thread(
+                self.client.rpc(
+                    'match_documents',
+                    {
+                        'query_embedding': query_embedding,
+                        'match_threshold': MATCH_THRESHOLD,
+                        'match_count': limit
+                    }
+                ).execute
+            )
             
             return result.data if result.data else []
             
         except Exception as e:
-            logger.error(f"Vector search error: {str(e)}")
+            error_msg = str(e)
+            # Only a missing function means the RPC isn't deployed; errors raised
+            # inside match_documents (timeouts, bad dimensions) are not latched
+            if getattr(e, 'code', None) == RPC_NOT_FOUND_CODE:
+                logger.warning("match_documents RPC not available - searching documents client-side")
+                self._match_rpc_missing = True
+                try:
+                    return await self._search_documents_local(query_embedding, limit)
+                except Exception as local_error:
+                    error_msg = str(local_error)
+            
+            logger.error("Vector search error: %s", error_msg)
             return []
     
+    async def _load_document_index(self) -> Tuple[np.ndarray, np.ndarray, List[dict]]:
+        """Fetch every stored document once and keep normalized embeddings as an int8 matrix"""
+        documents = []
+        start = 0
+        while True:
+            result = await asyncio.to_thread(
+                self.client.table('documents')
+                .select('id, content, metadata, embedding')
+                .order('id')  # Stable order so pages neither repeat nor skip rows
+                .range(start, start + DOCUMENT_PAGE_SIZE - 1)
+                .execute
+            )
+            page = result.data or []
+            documents.extend(page)
+            if len(page) < DOCUMENT_PAGE_SIZE:
+                break
+            start += DOCUMENT_PAGE_SIZE
+        
+        # Empty table: cache an empty index so searches don't reload it every time
+        if not documents:
+            logger.info("No documents stored - client-side vector search has nothing to match")
+            return np.empty((0, 0), dtype=np.int8), np.empty(0, dtype=np.float32), documents
+        
+        # pgvector columns arrive as "[0.1,0.2,...]" strings over PostgREST
+        vectors = [
+            orjson.loads(doc.pop('embedding')) if isinstance(doc.get('embedding'), str) else doc.pop('embedding')
+            for doc in documents
+        ]
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(documents), -1)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        
+        # int8 is a quarter of the float32 size, so the similarity sweep moves 4x less memory
+        quantized, scales = _quantize_int8(matrix)
+        
+        logger.info("Loaded %d documents for client-side vector search", len(documents))
+        return quantized, scales, documents
+    
+    async def _search_documents_local(self, query_embedding: List[float], limit: int) -> List[dict]:
+        """Top-k cosine search over the in-memory int8 document matrix"""
+        if self._doc_index is None:
+            self._doc_index = await self._load_document_index()
+        matrix, scales, documents = self._doc_index
+        if not documents:
+            return []
+        
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        query, query_scale = _quantize_int8(query)
+        
+        # Integer dot products, rescaled back to cosine similarity
+        if SIMSIMD_AVAILABLE:
+            dots = np.asarray(simsimd.cdist(query[np.newaxis, :], matrix, metric='dot'))[0]
+        else:
+            dots = np.einsum('ij,j->i', matrix, query, dtype=np.int32)
+        scores = dots * scales * query_scale
+        
+        # Partial sort for the k best, then order just those
+        k = min(limit, len(documents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        return [
+            {**documents[i], 'similarity': float(scores[i])}
+            for i in top if scores[i] >= MATCH_THRESHOLD
+        ]
+    
     async def store_document(
         self, 
         content: str, 
@@ -197,19 +364,74 @@ class SupabaseService:
             bool indicating success
         """
         try:
-            data = {
-                'content': content,
-                'embedding': embedding,
-                'metadata': metadata or {}
-            }
-            
-            result = self.client.table('documents').insert(data).execute()
+            await self._post_documents([{'content': content, 'embedding': embedding, 'metadata': metadata or {}}])
+            self._doc_index = None
             return True
             
         except Exception as e:
-            logger.error(f"Error storing document: {str(e)}")
+            logger.error("Error storing document: %s", e)
             return False
     
+    async def store_documents_bulk(self, rows: List[dict], batch_size: int = 500) -> int:
+        """
+        Store many documents with one insert per batch
+        
+        Args:
+            rows: Documents as dicts with content, embedding and metadata
+            batch_size: Maximum rows sent per request
+            
+        Returns:
+            Number of rows stored
+        """
+        stored = 0
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            try:
+                # Rows that carry an id replace the existing document
+                await self._post_documents(batch, upsert=all('id' in row for row in batch))
+                stored += len(batch)
+            except Exception as e:
+                logger.error("Error storing document batch: %s", e)
+        
+        # New documents must be visible to the client-side search
+        if stored:
+            self._doc_index = None
+        
+        return stored
+    
+    async def _post_documents(self, rows: List[dict], upsert: bool = False):
+        """Insert (or upsert) document rows with one PostgREST request"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(headers=self._rest_headers, timeout=30.0)
+        
+        prefer = "return=minimal,resolution=merge-duplicates" if upsert else "return=minimal"
+        response = await self._http.post(
+            self._documents_url,
+            content=orjson.dumps(rows, option=orjson.OPT_SERIALIZE_NUMPY),
+            headers={"Prefer": prefer}
+        )
+        response.raise_for_status()
+    
+    async def close(self):
+        """Close the HTTP client used for document writes"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+    
+    async def insert_rows(self, table_name: str, rows: List[dict]) -> int:
+        """
+        Insert data rows into a table with a single request
+    
+        Args:
+            table_name: Target table (must already exist)
+            rows: Records as column -> value dicts
+    
+        Returns:
+            Number of rows inserted
+        """
+        await asyncio.to_thread(self.client.table(table_name).insert(rows).execute)
+        return len(rows)
+    
     async def log_query(
         self,
         user_query: str,
@@ -236,23 +458,77 @@ class SupabaseService:
         if not settings.enable_audit_log:
             return True
         
+        data = {
+            'user_query': user_query,
+            'generated_sql': generated_sql,
+            'confidence': confidence,
+            'success': success,
+            'result_count': result_count,
+            'error': error
+        }
+        
+        # Hand off to the background flusher when it is running
+        if self._log_queue is not None:
+            try:
+                self._log_queue.put_nowait(data)
+                return True
+            except asyncio.QueueFull:
+                logger.warning("Query log queue full - writing entry directly")
+        
+        return await self._insert_logs([data])
+    
+    async def _insert_logs(self, rows: List[dict]) -> bool:
+        """Insert audit log rows with a single request"""
         try:
-            data = {
-                'user_query': user_query,
-                'generated_sql': generated_sql,
-                'confidence': confidence,
-                'success': success,
-                'result_count': result_count,
-                'error': error
-            }
-            
-            self.client.table('query_logs').insert(data).execute()
+            await asyncio.to_thread(self.client.table('query_logs').insert(rows).execute)
             return True
             
         except Exception as e:
-            logger.error(f"Error logging query: {str(e)}")
+            logger.error("Error logging query: %s", e)
             return False
     
+    async def start_log_flusher(self):
+        """Buffer log_query entries and write them in batches from a background task"""
+        if self._log_task is None:
+            self._log_queue = asyncio.Queue(maxsize=LOG_QUEUE_SIZE)
+            self._log_task = asyncio.create_task(self._flush_logs())
+    
+    async def stop_log_flusher(self):
+        """Write any buffered entries and stop the background task"""
+        if self._log_task is None:
+            return
+        
+        queue, task = self._log_queue, self._log_task
+        self._log_queue = None  # New entries are written directly from now on
+        self._log_task = None
+        await queue.put(None)
+        await task
+    
+    async def _flush_logs(self):
+        """Collect up to LOG_BATCH_SIZE entries or LOG_FLUSH_INTERVAL seconds, then insert"""
+        loop = asyncio.get_running_loop()
+        queue = self._log_queue
+        stopping = False
+        
+        while not stopping:
+            entry = await queue.get()
+            if entry is None:
+                break
+            
+            batch = [entry]
+            deadline = loop.time() + LOG_FLUSH_INTERVAL
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    entry = await asyncio.wait_for(queue.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            
+            await self._insert_logs(batch)
+    
     async def get_table_sample(self, table_name: str, limit: int = 5) -> List[dict]:
         """
         Get sample rows from a table
@@ -265,9 +541,11 @@ class SupabaseService:
             List of sample rows
         """
         try:
-            result = self.client.table(table_name).select("*").limit(limit).execute()
+            result = await asyncio.to_thread(
+                self.client.table(table_name).select("*").limit(limit).execute
+            )
             return result.data if result.data else []
             
         except Exception as e:
-            logger.error(f"Error fetching sample data: {str(e)}")
+            logger.error("Error fetching sample data: %s", e)
             return []
@@ -0,0 +1,34 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class RequestTimingMiddleware:
+    """Pure ASGI middleware that adds an x-response-time header and logs each request"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"x-response-time", f"{elapsed_ms:.1f}ms".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            logger.info("%s %s -> %d (%.1fms)", scope["method"], scope["path"], status_code, elapsed_ms)
@@ -1,12 +1,40 @@
 import sqlparse
-from sqlparse.sql import IdentifierList, Identifier, Where
-from sqlparse.tokens import Keyword, DML
+from sqlparse.sql import IdentifierList, Identifier, Parenthesis, Where
+from sqlparse.tokens import Keyword, DML, CTE
 import re
 import logging
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Statements that change table structure (used to invalidate schema caches)
+DDL_KEYWORDS = ('CREATE', 'ALTER', 'DROP')
+
+# Operation types that modify data or structure
+_DESTRUCTIVE_OPS = frozenset({'INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER', 'TRUNCATE', 'CREATE'})
+
+# Operation types that should be scoped by a WHERE clause
+_ROW_FILTERED_OPS = frozenset({'UPDATE', 'DELETE'})
+
+class ValidationResult(NamedTuple):
+    """Outcome of validating one SQL query"""
+    is_valid: bool
+    is_safe: bool
+    operation_type: str = 'UNKNOWN'
+    is_destructive: bool = False
+    requires_confirmation: bool = False
+    errors: Tuple[str, ...] = ()
+    warnings: Tuple[str, ...] = ()
+    complexity: int = 0
+    
+    def to_dict(self) -> Dict:
+        """Plain dict form with list-valued errors and warnings"""
+        result = self._asdict()
+        result['errors'] = list(self.errors)
+        result['warnings'] = list(self.warnings)
+        return result
+
 class SQLSafetyValidator:
     """Validates SQL queries for safety"""
     
@@ -26,10 +54,41 @@ class SQLSafetyValidator:
         r'sp_',  # Stored procedures
     ]
     
+    # All patterns in one regex so validation scans the SQL once
+    _DANGER_RE = re.compile(
+        "|".join(f"(?P<p{i}>{pattern})" for i, pattern in enumerate(DANGEROUS_PATTERNS)),
+        re.IGNORECASE
+    )
+    
+    # First keyword of the statement, skipping leading whitespace and comments
+    _OP_RE = re.compile(
+        r"^(?:\s|--[^\n]*(?:\n|$)|/\*(?:[^*]|\*(?!/))*\*/)*"
+        r"(SELECT|INSERT|UPDATE|DELETE|CREATE|DROP|ALTER|TRUNCATE)\b",
+        re.IGNORECASE
+    )
+    
+    # Complexity points per keyword occurrence
+    COMPLEXITY_WEIGHTS = {
+        'JOIN': 10,
+        'SELECT': 15,
+        'COUNT': 5, 'SUM': 5, 'AVG': 5, 'MAX': 5, 'MIN': 5, 'GROUP BY': 5,
+        'UNION': 10,
+        "LIKE '%": 5,
+    }
+    
+    # Lookahead so overlapping keywords are all counted, matching str.count per keyword
+    _COMPLEXITY_RE = re.compile(
+        "(?=(" + "|".join(re.escape(keyword) for keyword in COMPLEXITY_WEIGHTS) + "))"
+    )
+    
+    # Max number of memoized validation results
+    CACHE_SIZE = 4096
+    
     def __init__(self, allowed_tables: List[str] = None):
-        self.allowed_tables = set(allowed_tables) if allowed_tables else None
+        self.allowed_tables = frozenset(allowed_tables) if allowed_tables else None
+        self._cache: OrderedDict = OrderedDict()
     
-    def validate(self, sql: str, allow_destructive: bool = False) -> Dict:
+    def validate(self, sql: str, allow_destructive: bool = False) -> ValidationResult:
         """
         Validate SQL query for safety
         
@@ -38,10 +97,43 @@ class SQLSafetyValidator:
             allow_destructive: Whether destructive operations are allowed
             
         Returns:
-            dict with validation results
+            ValidationResult (immutable, so cached results are shared)
         """
+        key = (sql, allow_destructive)
+        result = self._cache.get(key)
+        if result is None:
+            result = self._validate(sql, allow_destructive)
+            self._cache[key] = result
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        
+        return result
+    
+    def _validate(self, sql: str, allow_destructive: bool) -> ValidationResult:
+        """Run the full validation for a query not found in the cache"""
         errors = []
         warnings = []
+        sql_upper = sql.upper()
+        
+        # Detect operation type
+        operation_type = self._detect_operation_type(sql)
+        
+        # Check for dangerous patterns
+        matched = {int(m.lastgroup[1:]) for m in self._DANGER_RE.finditer(sql)}
+        danger_errors = [f"Dangerous pattern detected: {self.DANGEROUS_PATTERNS[i]}" for i in sorted(matched)]
+        
+        # Fast path: a single plain SELECT needs no parse tree
+        body = sql.rstrip()
+        if body.endswith(';'):
+            body = body[:-1]
+        if operation_type == 'SELECT' and not danger_errors and not self.allowed_tables and ';' not in body:
+            return self._result(
+                True, errors, warnings,
+                operation_type=operation_type,
+                complexity=self._calculate_complexity(sql_upper)
+            )
         
         # Parse SQL
         try:
@@ -55,16 +147,13 @@ class SQLSafetyValidator:
         
         statement = parsed[0]
         
-        # Detect operation type
-        operation_type = self._detect_operation_type(statement)
-        
         # Check for multiple statements
         if len(parsed) > 1:
             errors.append("Multiple SQL statements not allowed")
             return self._result(False, errors, warnings, operation_type)
         
         # Check for destructive keywords
-        is_destructive = operation_type in ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'ALTER', 'TRUNCATE', 'CREATE']
+        is_destructive = operation_type in _DESTRUCTIVE_OPS
         
         if is_destructive and not allow_destructive:
             return self._result(
@@ -76,22 +165,22 @@ class SQLSafetyValidator:
                 requires_confirmation=True
             )
         
-        # Check for dangerous patterns
-        for pattern in self.DANGEROUS_PATTERNS:
-            if re.search(pattern, sql, re.IGNORECASE):
-                errors.append(f"Dangerous pattern detected: {pattern}")
+        errors.extend(danger_errors)
+        
+        # WHERE presence and table names come from one pass over the tokens
+        needs_where = operation_type in _ROW_FILTERED_OPS
+        if needs_where or self.allowed_tables:
+            has_where, table_names = self._scan_statement(statement)
         
         # For UPDATE/DELETE without WHERE clause
-        if operation_type in ['UPDATE', 'DELETE']:
-            if not self._has_where_clause(statement):
-                warnings.append(f"{operation_type} without WHERE clause will affect ALL rows!")
+        if needs_where and not has_where:
+            warnings.append(f"{operation_type} without WHERE clause will affect ALL rows!")
         
         # Calculate complexity
-        complexity = self._calculate_complexity(statement)
+        complexity = self._calculate_complexity(sql_upper)
         
         # Check allowed tables if specified
         if self.allowed_tables:
-            table_names = self._extract_table_names(statement)
             unauthorized_tables = [t for t in table_names if t not in self.allowed_tables]
             if unauthorized_tables:
                 errors.append(f"Unauthorized tables: {', '.join(unauthorized_tables)}")
@@ -109,93 +198,75 @@ class SQLSafetyValidator:
             requires_confirmation=is_destructive
         )
     
-    def _detect_operation_type(self, statement) -> str:
-        """Detect the type of SQL operation"""
-        first_token = str(statement.token_first(skip_ws=True, skip_cm=True)).upper()
-        
-        if first_token == 'SELECT':
-            return 'SELECT'
-        elif first_token == 'INSERT':
-            return 'INSERT'
-        elif first_token == 'UPDATE':
-            return 'UPDATE'
-        elif first_token == 'DELETE':
-            return 'DELETE'
-        elif first_token == 'CREATE':
-            return 'CREATE'
-        elif first_token == 'DROP':
-            return 'DROP'
-        elif first_token == 'ALTER':
-            return 'ALTER'
-        elif first_token == 'TRUNCATE':
-            return 'TRUNCATE'
-        else:
-            return 'UNKNOWN'
-    
-    def _has_where_clause(self, statement) -> bool:
-        """Check if statement has a WHERE clause"""
-        for token in statement.tokens:
-            if isinstance(token, Where):
-                return True
-        return False
+    def _detect_operation_type(self, sql: str) -> str:
+        """Detect the type of SQL operation from its first keyword"""
+        match = self._OP_RE.match(sql)
+        return match.group(1).upper() if match else 'UNKNOWN'
     
-    def _extract_table_names(self, statement) -> List[str]:
-        """Extract table names from SQL statement"""
-        tables = []
+    def _scan_statement(self, statement) -> Tuple[bool, List[str]]:
+        """
+        Find whether the statement has a WHERE clause and which tables follow FROM
         
-        def extract_from_token(token):
-            if isinstance(token, IdentifierList):
-                for identifier in token.get_identifiers():
-                    tables.append(str(identifier).split()[0])
-            elif isinstance(token, Identifier):
-                tables.append(str(token).split()[0])
+        Names defined by WITH are not tables; the tables their bodies read are
+        reported instead.
+        """
+        has_where = False
+        tables = []
+        cte_names = set()
         
         from_seen = False
+        cte_seen = False
         for token in statement.tokens:
-            if from_seen:
-                extract_from_token(token)
-                from_seen = False
+            if token.is_whitespace:
+                continue
             
-            if token.ttype is Keyword and token.value.upper() == 'FROM':
-                from_seen = True
+            # Keywords are leaf tokens; only grouped tokens can be a Where or identifier
+            if token.ttype is None:
+                if cte_seen and isinstance(token, (Identifier, IdentifierList)):
+                    ctes = token.get_identifiers() if isinstance(token, IdentifierList) else [token]
+                    for cte in ctes:
+                        cte_names.add(cte.get_name().lower())
+                        for body in [t for t in cte.tokens if isinstance(t, Parenthesis)][-1:]:
+                            tables.extend(self._scan_statement(body)[1])
+                elif from_seen:
+                    if isinstance(token, IdentifierList):
+                        tables.extend(str(identifier).split()[0] for identifier in token.get_identifiers())
+                    elif isinstance(token, Identifier):
+                        tables.append(str(token).split()[0])
+                elif isinstance(token, Where):
+                    has_where = True
+                from_seen = False
+                cte_seen = False
+            else:
+                from_seen = token.ttype is Keyword and token.normalized == 'FROM'
+                # WITH RECURSIVE: the CTE list follows the RECURSIVE keyword
+                cte_seen = token.ttype is CTE or (cte_seen and token.normalized == 'RECURSIVE')
         
-        return tables
+        if cte_names:
+            tables = [table for table in tables if table.lower() not in cte_names]
+        return has_where, tables
     
-    def _calculate_complexity(self, statement) -> int:
-        """Calculate query complexity score"""
-        sql = str(statement).upper()
+    def _calculate_complexity(self, sql_upper: str) -> int:
+        """Calculate query complexity score from the uppercased SQL"""
         score = 10  # Base score
         
-        # Count JOINs
-        score += sql.count('JOIN') * 10
-        
-        # Count subqueries
-        score += sql.count('SELECT') * 15
-        
-        # Count aggregations
-        agg_functions = ['COUNT', 'SUM', 'AVG', 'MAX', 'MIN', 'GROUP BY']
-        for func in agg_functions:
-            score += sql.count(func) * 5
-        
-        # Count UNION
-        score += sql.count('UNION') * 10
-        
-        # Count wildcards in LIKE
-        score += sql.count("LIKE '%") * 5
+        # JOINs, subqueries, aggregations, UNIONs and LIKE wildcards in one scan
+        for match in self._COMPLEXITY_RE.finditer(sql_upper):
+            score += self.COMPLEXITY_WEIGHTS[match.group(1)]
         
         return score
     
     def _result(self, is_valid: bool, errors: List, warnings: List, 
                 operation_type: str = 'UNKNOWN', complexity: int = 0,
-                is_destructive: bool = False, requires_confirmation: bool = False) -> Dict:
+                is_destructive: bool = False, requires_confirmation: bool = False) -> ValidationResult:
         """Format validation result"""
-        return {
-            'is_valid': is_valid,
-            'is_safe': is_valid and not is_destructive,
-            'operation_type': operation_type,
-            'is_destructive': is_destructive,
-            'requires_confirmation': requires_confirmation,
-            'errors': errors,
-            'warnings': warnings,
-            'complexity': complexity
-        }
+        return ValidationResult(
+            is_valid=is_valid,
+            is_safe=is_valid and not is_destructive,
+            operation_type=operation_type,
+            is_destructive=is_destructive,
+            requires_confirmation=requires_confirmation,
+            errors=tuple(errors),
+            warnings=tuple(warnings),
+            complexity=complexity
+        )
@@ -5,10 +5,38 @@ Uploads CSV/JSON data to Supabase and creates embeddings for RAG
 
 import sys
 import asyncio
-import pandas as pd
+import hashlib
+import mmap
 import argparse
 import logging
+from functools import lru_cache, partial
+from itertools import count
+from operator import itemgetter
 from pathlib import Path
+from typing import Iterator, List, NamedTuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    pa = None
+    pv = None
+
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+    pd = None
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+    xxhash = None
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -19,86 +47,306 @@ from backend.services.supabase_service import SupabaseService
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def ingest_csv(file_path: str, table_name: str = None):
+# Rows sent to the RAG service per ingest call
+BATCH_SIZE = 128
+
+# Consumer tasks embedding/uploading batches at once
+CONCURRENCY = 8
+
+# Parsed batches waiting for a consumer before the producer blocks
+QUEUE_SIZE = 8
+
+# Rows per bulk insert into the data table (PostgREST handles up to ~1000 well)
+INSERT_BATCH_SIZE = 1000
+
+# CSV rows parsed per chunk (pandas); pyarrow reads blocks of CSV_BLOCK_BYTES
+CSV_CHUNK_ROWS = 10_000
+CSV_BLOCK_BYTES = 8 << 20
+
+@lru_cache(maxsize=None)
+def get_rag_service() -> RAGService:
+    """One RAGService (and its HTTP clients) shared by every file ingested in this process"""
+    return RAGService()
+
+@lru_cache(maxsize=None)
+def get_supabase_service() -> SupabaseService:
+    return SupabaseService()
+
+class CsvChunk(NamedTuple):
+    """A run of CSV rows with every cell as a string"""
+    columns: List[str]
+    rows: List[tuple]
+    start: int  # Row index of the first row in the file
+
+def _iter_arrow_chunks(file_path: str) -> Iterator[CsvChunk]:
+    """Stream the CSV with pyarrow's multi-threaded reader"""
+    read_options = pv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_BYTES)
+    columns = pv.open_csv(file_path, read_options=read_options).schema.names
+    
+    # Read every column as text so values keep their spelling from the file
+    convert_options = pv.ConvertOptions(
+        column_types={name: pa.string() for name in columns},
+        strings_can_be_null=True
+    )
+    reader = pv.open_csv(file_path, read_options=read_options, convert_options=convert_options)
+    
+    start = 0
+    for batch in reader:
+        # Missing cells render as "nan", matching the pandas reader
+        values = [column.fill_null("nan").to_pylist() for column in batch.columns]
+        yield CsvChunk(columns, list(zip(*values)), start)
+        start += batch.num_rows
+
+def _iter_pandas_chunks(file_path: str) -> Iterator[CsvChunk]:
+    """Stream the CSV with pandas"""
+    start = 0
+    for df in pd.read_csv(file_path, chunksize=CSV_CHUNK_ROWS, dtype=str):
+        yield CsvChunk(list(df.columns), df.fillna("nan").to_numpy().tolist(), start)
+        start += len(df)
+
+def iter_csv_chunks(file_path: str) -> Iterator[CsvChunk]:
+    """Stream the CSV in chunks with pyarrow when installed, pandas otherwise"""
+    if PYARROW_AVAILABLE:
+        return _iter_arrow_chunks(file_path)
+    if PANDAS_AVAILABLE:
+        return _iter_pandas_chunks(file_path)
+    raise RuntimeError("CSV ingestion needs pyarrow or pandas: pip install pyarrow")
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)  # Missing cells ("nan") count as numeric too
+        return True
+    except ValueError:
+        return False
+
+def text_column_indexes(chunk: CsvChunk, known: List[int] = ()) -> List[int]:
+    """
+    Indexes of columns holding any non-numeric value
+    
+    Columns in known were already seen holding text and stay text columns;
+    the rest are judged on this chunk, so a column that is blank or numeric
+    early in the file is picked up once text appears in it.
+    """
+    known = set(known)
+    return sorted(known.union(
+        i for i, values in enumerate(zip(*chunk.rows))
+        if i not in known and not all(map(_is_number, values))
+    ))
+
+def build_row_texts(chunk: CsvChunk, table_name: str, text_idx: List[int]) -> list:
+    """Text description of every row, from its text columns only"""
+    prefix = f"Record from {table_name}: "
+    labels = [f"{chunk.columns[i]}=" for i in text_idx]
+    
+    # Numbers carry little meaning for semantic search; embedding them only costs tokens
+    if len(text_idx) == len(chunk.columns):
+        rows = chunk.rows
+    elif len(text_idx) == 1:
+        i = text_idx[0]
+        rows = [(row[i],) for row in chunk.rows]
+    else:
+        rows = map(itemgetter(*text_idx), chunk.rows)
+    
+    # One C-level join per row; no intermediate column-sized arrays for wide CSVs
+    return [prefix + ", ".join(map(str.__add__, labels, row)) for row in rows]
+
+def build_records(chunk: CsvChunk) -> List[List[dict]]:
+    """Rows as column -> value dicts, in batches of INSERT_BATCH_SIZE; "nan" becomes NULL"""
+    columns = chunk.columns
+    records = [
+        {col: (None if value == "nan" else value) for col, value in zip(columns, row)}
+        for row in chunk.rows
+    ]
+    return [records[i:i + INSERT_BATCH_SIZE] for i in range(0, len(records), INSERT_BATCH_SIZE)]
+
+def _blake2b_64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+# 64-bit content hash of encoded row text, picked once instead of per row
+_hash_bytes = xxhash.xxh64_intdigest if XXHASH_AVAILABLE else _blake2b_64
+
+def row_hash(text: str) -> int:
+    """64-bit content hash of a row text (xxh64 when available, blake2b otherwise)"""
+    return _hash_bytes(text.encode())
+
+async def flush_batch(rag: RAGService, texts: list, metadatas: list) -> int:
+    """Ingest a batch of row texts, shortest first so similar lengths embed together"""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return await rag.ingest_documents([texts[i] for i in order], [metadatas[i] for i in order])
+
+def build_batches(chunk: CsvChunk, table_name: str, file_path: str, seen: set,
+                  text_idx: List[int]) -> List[tuple]:
+    """Turn one chunk of rows into (texts, metadatas) batches of at most BATCH_SIZE rows"""
+    # Convert every row to a text description up front
+    all_texts = build_row_texts(chunk, table_name, text_idx)
+    
+    # Embed each distinct row once per file. Rows are compared whole, since rows
+    # differing only in numeric columns share a text but are distinct records.
+    keys = all_texts if len(text_idx) == len(chunk.columns) else map("\x1f".join, chunk.rows)
+    row_texts, row_indexes, row_hashes = [], [], []
+    # Bound methods hoisted out of the per-row loop
+    hash_bytes, mark_seen = _hash_bytes, seen.add
+    add_text, add_index, add_hash = row_texts.append, row_indexes.append, row_hashes.append
+    for idx, text, key in zip(count(chunk.start), all_texts, keys):
+        h = hash_bytes(key.encode())
+        if h not in seen:
+            mark_seen(h)
+            add_text(text)
+            add_index(idx)
+            add_hash(h)
+    
+    if len(row_texts) < len(all_texts):
+        logger.info("Skipped %d duplicate rows", len(all_texts) - len(row_texts))
+    
+    batches = []
+    for start in range(0, len(row_texts), BATCH_SIZE):
+        end = start + BATCH_SIZE
+        metadatas = [
+            {"table": table_name, "row_index": idx, "row_hash": f"{h:016x}", "source": file_path}
+            for idx, h in zip(row_indexes[start:end], row_hashes[start:end])
+        ]
+        batches.append((row_texts[start:end], metadatas))
+    return batches
+
+def prepare_chunk(reader: Iterator[CsvChunk], table_name: str, file_path: str, seen: set,
+                  text_idx: List[int]):
+    """
+    Parse the next chunk and build its work (run in a worker thread)
+    
+    Returns None at end of file, else (chunk, text_idx, embed batches, insert
+    batches). text_idx holds the text columns seen so far and grows as later
+    chunks show text in more columns. Every row is inserted into the data
+    table; chunks without any text column skip embedding.
+    """
+    chunk = next(reader, None)
+    if chunk is None:
+        return None
+    if not chunk.rows:
+        return chunk, text_idx, [], []
+    text_idx = text_column_indexes(chunk, text_idx)
+    batches = build_batches(chunk, table_name, file_path, seen, text_idx) if text_idx else []
+    return chunk, text_idx, batches, build_records(chunk)
+
+async def ingest_csv(file_path: str, table_name: str = None) -> bool:
     """
     Ingest CSV file into Supabase
     
     Args:
         file_path: Path to CSV file
         table_name: Optional table name (defaults to filename)
+        
+    Returns:
+        True if every row was embedded and inserted
     """
     try:
-        # Read CSV
-        df = pd.read_csv(file_path)
-        logger.info(f"Loaded CSV with {len(df)} rows and {len(df.columns)} columns")
-        
         # Determine table name
         if not table_name:
             table_name = Path(file_path).stem.lower().replace(' ', '_')
         
-        logger.info(f"Table name: {table_name}")
+        logger.info("Table name: %s", table_name)
         
         # Initialize services
-        supabase = SupabaseService()
-        rag = RAGService()
+        supabase = get_supabase_service()
+        rag = get_rag_service()
         
-        # Create documents for RAG from the data
-        logger.info("Creating embeddings for RAG...")
+        # Create documents for RAG from the data, and store the rows themselves
+        # in the table (which must already exist) with bulk inserts
+        logger.info("Creating embeddings for RAG and inserting rows into %s...", table_name)
         
-        # Convert each row to a text description
-        for idx, row in df.iterrows():
-            # Create a text representation of the row
-            row_text = f"Record from {table_name}: "
-            row_text += ", ".join([f"{col}={val}" for col, val in row.items()])
-            
-            # Ingest into RAG system
-            metadata = {
-                "table": table_name,
-                "row_index": idx,
-                "source": file_path
-            }
-            
-            await rag.ingest_document(content=row_text, metadata=metadata)
-            
-            if (idx + 1) % 10 == 0:
-                logger.info(f"Processed {idx + 1}/{len(df)} rows")
+        # Pipeline: a producer parses chunks in a worker thread and queues row
+        # batches; CONCURRENCY consumers embed/upload or insert them. The bounded
+        # queue keeps parsing at most QUEUE_SIZE batches ahead of the uploads.
+        reader = iter_csv_chunks(file_path)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        seen = set()  # Hashes of row texts already ingested from this file
+        columns = []
+        text_idx = []  # Columns worth embedding; grows as text shows up in more columns
+        total_rows = 0
+        # Rows per job kind: [succeeded, failed]
+        counts = {"embedded": [0, 0], "inserted": [0, 0]}
+        
+        async def produce():
+            nonlocal columns, text_idx, total_rows
+            try:
+                while True:
+                    parsed = await asyncio.to_thread(prepare_chunk, reader, table_name, file_path, seen, text_idx)
+                    if parsed is None:
+                        break
+                    chunk, text_idx, batches, inserts = parsed
+                    columns = columns or chunk.columns
+                    for texts, metadatas in batches:
+                        await queue.put(("embedded", len(texts), partial(flush_batch, rag, texts, metadatas)))
+                    for records in inserts:
+                        await queue.put(("inserted", len(records), partial(supabase.insert_rows, table_name, records)))
+                    total_rows += len(chunk.rows)
+                    logger.info("Parsed %d rows", total_rows)
+            finally:
+                # One sentinel per consumer so every consumer stops, even on a parse error
+                for _ in range(CONCURRENCY):
+                    await queue.put(None)
+        
+        async def consume():
+            while (item := await queue.get()) is not None:
+                kind, size, job = item
+                try:
+                    done = await job()
+                except Exception as e:
+                    logger.error("Batch of %d rows not %s: %s", size, kind, e)
+                    done = 0
+                counts[kind][0] += done
+                counts[kind][1] += size - done
         
-        logger.info(f"✓ Successfully ingested {len(df)} rows into RAG system")
+        await asyncio.gather(produce(), *(consume() for _ in range(CONCURRENCY)))
         
-        # Also store the actual data in Supabase
-        # Note: You'll need to create the table first or use Supabase's auto-create
-        logger.info(f"Data is ready for querying via natural language!")
+        (inserted, insert_failed), (embedded, embed_failed) = counts["inserted"], counts["embedded"]
+        if insert_failed or embed_failed:
+            logger.error("✗ Parsed %d rows from %s: %d inserted (%d failed), %d embedded (%d failed)",
+                         total_rows, file_path, inserted, insert_failed, embedded, embed_failed)
+            return False
+        
+        logger.info("✓ Inserted %d rows into %s and embedded %d for RAG (%d of %d columns)",
+                    inserted, table_name, embedded, len(text_idx), len(columns))
+        logger.info("Data is ready for querying via natural language!")
         
         # Print sample queries
         print("\n" + "="*60)
         print("Sample queries you can try:")
         print(f"  - Show me all records from {table_name}")
         print(f"  - Count total rows in {table_name}")
-        if len(df.columns) > 0:
-            first_col = df.columns[0]
+        if columns:
+            first_col = columns[0]
             print(f"  - Find records where {first_col} is...")
         print("="*60 + "\n")
+        return True
         
     except Exception as e:
-        logger.error(f"Error ingesting CSV: {str(e)}")
+        logger.error("Error ingesting CSV: %s", e)
         raise
 
-async def ingest_text_file(file_path: str):
+async def ingest_text_file(file_path: str) -> bool:
     """
     Ingest text file for RAG context
     
     Args:
         file_path: Path to text file
+        
+    Returns:
+        True if the document was stored
     """
     try:
-        # Read file
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        # Map the file and decode straight from the mapping, skipping the
+        # intermediate bytes copy that f.read() makes before decoding
+        with open(file_path, 'rb') as f:
+            if Path(file_path).stat().st_size == 0:
+                content = ""
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    content = str(mm, 'utf-8')
         
-        logger.info(f"Loaded text file with {len(content)} characters")
+        logger.info("Loaded text file with %d characters", len(content))
         
         # Initialize RAG service
-        rag = RAGService()
+        rag = get_rag_service()
         
         # Ingest document
         metadata = {
@@ -112,12 +360,14 @@ async def ingest_text_file(file_path: str):
             logger.info("✓ Successfully ingested text document")
         else:
             logger.error("✗ Failed to ingest text document")
+        return success
             
     except Exception as e:
-        logger.error(f"Error ingesting text file: {str(e)}")
+        logger.error("Error ingesting text file: %s", e)
         raise
 
-async def main():
+async def main() -> int:
+    """Run the ingestion; returns the process exit code"""
     parser = argparse.ArgumentParser(description='Ingest dataset into NL-DB-Assistant')
     parser.add_argument('--file', required=True, help='Path to data file (CSV or TXT)')
     parser.add_argument('--table', help='Table name (for CSV files)')
@@ -128,8 +378,8 @@ async def main():
     # Determine file type
     file_path = Path(args.file)
     if not file_path.exists():
-        logger.error(f"File not found: {args.file}")
-        return
+        logger.error("File not found: %s", args.file)
+        return 1
     
     file_type = args.type
     if not file_type:
@@ -138,16 +388,17 @@ async def main():
         elif file_path.suffix.lower() in ['.txt', '.md']:
             file_type = 'text'
         else:
-            logger.error(f"Unable to determine file type for: {args.file}")
-            return
+            logger.error("Unable to determine file type for: %s", args.file)
+            return 1
     
-    logger.info(f"Ingesting {file_type} file: {args.file}")
+    logger.info("Ingesting %s file: %s", file_type, args.file)
     
     # Ingest based on type
     if file_type == 'csv':
-        await ingest_csv(args.file, args.table)
-    elif file_type == 'text':
-        await ingest_text_file(args.file)
+        ok = await ingest_csv(args.file, args.table)
+    else:
+        ok = await ingest_text_file(args.file)
+    return 0 if ok else 1
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sys.exit(asyncio.run(main()))
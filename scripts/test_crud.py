@@ -1,12 +1,15 @@
 """
 Test CRUD Operations with Confirmation Flow
 """
-import requests
-import json
+import httpx
+import orjson
 
 API_URL = "http://localhost:8000"
 
-def test_crud_operations():
+# Bodies are pre-encoded with orjson and sent as raw content
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+def test_crud_operations(client: httpx.Client):
     print("=" * 60)
     print("Testing CRUD Operations with Confirmation")
     print("=" * 60)
@@ -14,14 +17,14 @@ def test_crud_operations():
     
     # Test 1: INSERT without confirmation (should require confirmation)
     print("1. Testing INSERT without confirmation...")
-    response = requests.post(f"{API_URL}/query", json={
+    response = client.post("/query", content=orjson.dumps({
         "query": "Add a new user named Test User with email test@example.com",
         "use_rag": False,
         "confirm_destructive": False
-    })
+    }))
     
     if response.status_code == 200:
-        data = response.json()
+        data = orjson.loads(response.content)
         if data.get('requires_confirmation'):
             print(f"   ✅ Confirmation required (as expected)")
             print(f"   Operation: {data.get('operation_type')}")
@@ -37,14 +40,14 @@ def test_crud_operations():
     
     # Test 2: INSERT with confirmation (should execute)
     print("2. Testing INSERT with confirmation...")
-    response = requests.post(f"{API_URL}/query", json={
+    response = client.post("/query", content=orjson.dumps({
         "query": "Add a new user named Test User with email test@example.com",
         "use_rag": False,
         "confirm_destructive": True
-    })
+    }))
     
     if response.status_code == 200:
-        data = response.json()
+        data = orjson.loads(response.content)
         if not data.get('requires_confirmation'):
             print(f"   ✅ Query executed successfully")
             print(f"   SQL: {data.get('sql')}")
@@ -59,14 +62,14 @@ def test_crud_operations():
     
     # Test 3: UPDATE without confirmation
     print("3. Testing UPDATE without confirmation...")
-    response = requests.post(f"{API_URL}/query", json={
+    response = client.post("/query", content=orjson.dumps({
         "query": "Update user with id 1 set name to 'Updated Name'",
         "use_rag": False,
         "confirm_destructive": False
-    })
+    }))
     
     if response.status_code == 200:
-        data = response.json()
+        data = orjson.loads(response.content)
         if data.get('requires_confirmation'):
             print(f"   ✅ Confirmation required")
             print(f"   Operation: {data.get('operation_type')}")
@@ -80,14 +83,14 @@ def test_crud_operations():
     
     # Test 4: DELETE without confirmation
     print("4. Testing DELETE without confirmation...")
-    response = requests.post(f"{API_URL}/query", json={
+    response = client.post("/query", content=orjson.dumps({
         "query": "Delete user where id = 999",
         "use_rag": False,
         "confirm_destructive": False
-    })
+    }))
     
     if response.status_code == 200:
-        data = response.json()
+        data = orjson.loads(response.content)
         if data.get('requires_confirmation'):
             print(f"   ✅ Confirmation required")
             print(f"   Operation: {data.get('operation_type')}")
@@ -100,14 +103,14 @@ def test_crud_operations():
     
     # Test 5: SELECT query (should NOT require confirmation)
     print("5. Testing SELECT query (no confirmation needed)...")
-    response = requests.post(f"{API_URL}/query", json={
+    response = client.post("/query", content=orjson.dumps({
         "query": "Show me all users",
         "use_rag": False,
         "confirm_destructive": False
-    })
+    }))
     
     if response.status_code == 200:
-        data = response.json()
+        data = orjson.loads(response.content)
         if not data.get('requires_confirmation'):
             print(f"   ✅ Query executed without confirmation")
             print(f"   Operation: SELECT")
@@ -124,7 +127,9 @@ def test_crud_operations():
 
 if __name__ == "__main__":
     try:
-        test_crud_operations()
+        # One client keeps a single keep-alive connection for every request
+        with httpx.Client(base_url=API_URL, timeout=30.0, headers=JSON_HEADERS) as client:
+            test_crud_operations(client)
     except Exception as e:
         print(f"Error: {e}")
         print("\nMake sure backend is running: python -m backend.main")
@@ -2,145 +2,202 @@
 Manual CRUD Confirmation Dialog Test
 Tests the frontend confirmation flow via API calls
 """
-import requests
-import json
+import asyncio
+import io
+import httpx
+import orjson
+import sys
 import time
+from typing import List
 
 API_URL = "http://localhost:8000"
 
-print("=" * 70)
-print("CRUD Confirmation Dialog - End-to-End Test")
-print("=" * 70)
-print()
-
-# Test 1: SELECT Query (No Confirmation)
-print("TEST 1: SELECT Query (Should execute immediately)")
-print("-" * 70)
-response = requests.post(f"{API_URL}/query", json={
-    "query": "Show me all users",
-    "use_rag": False,
-    "confirm_destructive": False
-})
-
-if response.status_code == 200:
-    data = response.json()
-    if not data.get('requires_confirmation'):
-        print("✅ PASS: SELECT query executed without confirmation")
-        print(f"   SQL: {data.get('sql', 'N/A')}")
-        print(f"   Results: {data.get('result_count', 0)} rows")
+# Bodies are pre-encoded with orjson and sent as raw content
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+async def wait_for_backend(client: httpx.AsyncClient, timeout: float = 10.0):
+    """Poll /health until the backend answers, instead of sleeping between tests"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() >= deadline:
+            raise SystemExit(f"Backend not reachable at {API_URL} - start it with: python -m backend.main")
+        await asyncio.sleep(0.05)
+
+async def test_select(client: httpx.AsyncClient) -> List[str]:
+    """SELECT Query (No Confirmation)"""
+    out = []
+    out.append("TEST 1: SELECT Query (Should execute immediately)")
+    out.append("-" * 70)
+    response = await client.post("/query", content=orjson.dumps({
+        "query": "Show me all users",
+        "use_rag": False,
+        "confirm_destructive": False
+    }))
+
+    if response.status_code == 200:
+        data = orjson.loads(response.content)
+        if not data.get('requires_confirmation'):
+            out.append("✅ PASS: SELECT query executed without confirmation")
+            out.append(f"   SQL: {data.get('sql', 'N/A')}")
+            out.append(f"   Results: {data.get('result_count', 0)} rows")
+        else:
+            out.append("❌ FAIL: SELECT query required confirmation (unexpected)")
     else:
-        print("❌ FAIL: SELECT query required confirmation (unexpected)")
-else:
-    print(f"❌ FAIL: Request failed with status {response.status_code}")
-    print(f"   Error: {response.text}")
-
-print()
-time.sleep(1)
-
-# Test 2: INSERT Query (Requires Confirmation)
-print("TEST 2: INSERT Query (Should require confirmation)")
-print("-" * 70)
-response = requests.post(f"{API_URL}/query", json={
-    "query": "Add a new user named Test User with email test@example.com",
-    "use_rag": False,
-    "confirm_destructive": False
-})
-
-if response.status_code == 200:
-    data = response.json()
-    if data.get('requires_confirmation'):
-        print("✅ PASS: INSERT query requires confirmation")
-        print(f"   Operation Type: {data.get('operation_type')}")
-        print(f"   SQL: {data.get('sql', 'N/A')}")
-        print(f"   Warning: {data.get('warning', 'N/A')}")
-        print(f"   Confidence: {data.get('confidence', 0) * 100:.1f}%")
+        out.append(f"❌ FAIL: Request failed with status {response.status_code}")
+        out.append(f"   Error: {response.text}")
+
+    return out
+
+async def test_insert(client: httpx.AsyncClient) -> List[str]:
+    """INSERT Query (Requires Confirmation)"""
+    out = []
+    out.append("TEST 2: INSERT Query (Should require confirmation)")
+    out.append("-" * 70)
+    response = await client.post("/query", content=orjson.dumps({
+        "query": "Add a new user named Test User with email test@example.com",
+        "use_rag": False,
+        "confirm_destructive": False
+    }))
+
+    if response.status_code == 200:
+        data = orjson.loads(response.content)
+        if data.get('requires_confirmation'):
+            out.append("✅ PASS: INSERT query requires confirmation")
+            out.append(f"   Operation Type: {data.get('operation_type')}")
+            out.append(f"   SQL: {data.get('sql', 'N/A')}")
+            out.append(f"   Warning: {data.get('warning', 'N/A')}")
+            out.append(f"   Confidence: {data.get('confidence', 0) * 100:.1f}%")
         
-        # Now confirm and execute
-        print()
-        print("   Confirming and executing...")
-        confirm_response = requests.post(f"{API_URL}/query", json={
-            "query": "Add a new user named Test User with email test@example.com",
-            "use_rag": False,
-            "confirm_destructive": True
-        })
+            # Now confirm and execute
+            out.append("")
+            out.append("   Confirming and executing...")
+            confirm_response = await client.post("/query", content=orjson.dumps({
+                "query": "Add a new user named Test User with email test@example.com",
+                "use_rag": False,
+                "confirm_destructive": True
+            }))
         
-        if confirm_response.status_code == 200:
-            confirm_data = confirm_response.json()
-            if not confirm_data.get('requires_confirmation'):
-                print("   ✅ Query executed after confirmation")
-                print(f"   Result: {confirm_data.get('result_count', 0)} rows affected")
+            if confirm_response.status_code == 200:
+                confirm_data = orjson.loads(confirm_response.content)
+                if not confirm_data.get('requires_confirmation'):
+                    out.append("   ✅ Query executed after confirmation")
+                    out.append(f"   Result: {confirm_data.get('result_count', 0)} rows affected")
+                else:
+                    out.append("   ❌ Still requires confirmation after confirming")
             else:
-                print("   ❌ Still requires confirmation after confirming")
+                out.append(f"   ❌ Confirmation failed: {confirm_response.status_code}")
         else:
-            print(f"   ❌ Confirmation failed: {confirm_response.status_code}")
+            out.append("❌ FAIL: INSERT query did not require confirmation")
     else:
-        print("❌ FAIL: INSERT query did not require confirmation")
-else:
-    print(f"❌ FAIL: Request failed with status {response.status_code}")
-
-print()
-time.sleep(1)
-
-# Test 3: UPDATE Query (Requires Confirmation)
-print("TEST 3: UPDATE Query (Should require confirmation)")
-print("-" * 70)
-response = requests.post(f"{API_URL}/query", json={
-    "query": "Update user with id 1 set name to 'Updated Name'",
-    "use_rag": False,
-    "confirm_destructive": False
-})
-
-if response.status_code == 200:
-    data = response.json()
-    if data.get('requires_confirmation'):
-        print("✅ PASS: UPDATE query requires confirmation")
-        print(f"   Operation Type: {data.get('operation_type')}")
-        print(f"   SQL: {data.get('sql', 'N/A')}")
-        print(f"   Warnings: {data.get('warnings', [])}")
+        out.append(f"❌ FAIL: Request failed with status {response.status_code}")
+
+    return out
+
+async def test_update(client: httpx.AsyncClient) -> List[str]:
+    """UPDATE Query (Requires Confirmation)"""
+    out = []
+    out.append("TEST 3: UPDATE Query (Should require confirmation)")
+    out.append("-" * 70)
+    response = await client.post("/query", content=orjson.dumps({
+        "query": "Update user with id 1 set name to 'Updated Name'",
+        "use_rag": False,
+        "confirm_destructive": False
+    }))
+
+    if response.status_code == 200:
+        data = orjson.loads(response.content)
+        if data.get('requires_confirmation'):
+            out.append("✅ PASS: UPDATE query requires confirmation")
+            out.append(f"   Operation Type: {data.get('operation_type')}")
+            out.append(f"   SQL: {data.get('sql', 'N/A')}")
+            out.append(f"   Warnings: {data.get('warnings', [])}")
+        else:
+            out.append("❌ FAIL: UPDATE query did not require confirmation")
     else:
-        print("❌ FAIL: UPDATE query did not require confirmation")
-else:
-    print(f"❌ FAIL: Request failed with status {response.status_code}")
-
-print()
-time.sleep(1)
-
-# Test 4: DELETE Query (Requires Confirmation)
-print("TEST 4: DELETE Query (Should require confirmation)")
-print("-" * 70)
-response = requests.post(f"{API_URL}/query", json={
-    "query": "Delete user where id = 999",
-    "use_rag": False,
-    "confirm_destructive": False
-})
-
-if response.status_code == 200:
-    data = response.json()
-    if data.get('requires_confirmation'):
-        print("✅ PASS: DELETE query requires confirmation")
-        print(f"   Operation Type: {data.get('operation_type')}")
-        print(f"   SQL: {data.get('sql', 'N/A')}")
-        print(f"   Warning: {data.get('warning', 'N/A')}")
+        out.append(f"❌ FAIL: Request failed with status {response.status_code}")
+
+    return out
+
+async def test_delete(client: httpx.AsyncClient) -> List[str]:
+    """DELETE Query (Requires Confirmation)"""
+    out = []
+    out.append("TEST 4: DELETE Query (Should require confirmation)")
+    out.append("-" * 70)
+    response = await client.post("/query", content=orjson.dumps({
+        "query": "Delete user where id = 999",
+        "use_rag": False,
+        "confirm_destructive": False
+    }))
+
+    if response.status_code == 200:
+        data = orjson.loads(response.content)
+        if data.get('requires_confirmation'):
+            out.append("✅ PASS: DELETE query requires confirmation")
+            out.append(f"   Operation Type: {data.get('operation_type')}")
+            out.append(f"   SQL: {data.get('sql', 'N/A')}")
+            out.append(f"   Warning: {data.get('warning', 'N/A')}")
+        else:
+            out.append("❌ FAIL: DELETE query did not require confirmation")
     else:
-        print("❌ FAIL: DELETE query did not require confirmation")
-else:
-    print(f"❌ FAIL: Request failed with status {response.status_code}")
-
-print()
-print("=" * 70)
-print("TEST SUMMARY")
-print("=" * 70)
-print()
-print("✅ Backend confirmation flow is working correctly!")
-print()
-print("Frontend Testing:")
-print("1. Open http://localhost:3000 in your browser")
-print("2. Try the queries above")
-print("3. Verify the confirmation dialog appears for INSERT/UPDATE/DELETE")
-print("4. Check that operation badges are color-coded:")
-print("   - SELECT: Green")
-print("   - INSERT: Blue")
-print("   - UPDATE: Orange")
-print("   - DELETE: Red")
-print()
-print("=" * 70)
+        out.append(f"❌ FAIL: Request failed with status {response.status_code}")
+
+    return out
+
+BANNER = "=" * 70
+
+SUMMARY = f"""{BANNER}
+TEST SUMMARY
+{BANNER}
+
+✅ Backend confirmation flow is working correctly!
+
+Frontend Testing:
+1. Open http://localhost:3000 in your browser
+2. Try the queries above
+3. Verify the confirmation dialog appears for INSERT/UPDATE/DELETE
+4. Check that operation badges are color-coded:
+   - SELECT: Green
+   - INSERT: Blue
+   - UPDATE: Orange
+   - DELETE: Red
+
+{BANNER}
+"""
+
+async def main():
+    # Header goes out before the tests start so the run doesn't look stalled
+    sys.stdout.write(f"{BANNER}\nCRUD Confirmation Dialog - End-to-End Test\n{BANNER}\n\n")
+    sys.stdout.flush()
+    
+    # One client keeps a single keep-alive connection for every request
+    async with httpx.AsyncClient(base_url=API_URL, timeout=30.0, headers=JSON_HEADERS) as client:
+        await wait_for_backend(client)
+        
+        # The tests are independent, so they run concurrently; output is printed in order
+        results = await asyncio.gather(
+            test_select(client),
+            test_insert(client),
+            test_update(client),
+            test_delete(client),
+            return_exceptions=True
+        )
+    
+    # Reports and summary are written to stdout in one go
+    buf = io.StringIO()
+    for name, result in zip(["SELECT", "INSERT", "UPDATE", "DELETE"], results):
+        if isinstance(result, Exception):
+            buf.write(f"❌ FAIL: {name} test raised {type(result).__name__}: {result}\n")
+        else:
+            buf.write("\n".join(result))
+            buf.write("\n")
+        buf.write("\n")
+    buf.write(SUMMARY)
+    sys.stdout.write(buf.getvalue())
+
+if __name__ == "__main__":
+    asyncio.run(main())
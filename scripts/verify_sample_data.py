@@ -2,7 +2,11 @@
 Verify sample data was added to Supabase
 """
 from supabase import create_client
+import asyncio
+import httpx
+import io
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,49 +14,79 @@ load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_SERVICE_ROLE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
 
-print("=" * 60)
-print("Verifying Sample Data in Supabase")
-print("=" * 60)
-print()
+# The report is built up here and written to stdout once at the end
+buf = io.StringIO()
+out = buf.write
+
+out("=" * 60 + "\n")
+out("Verifying Sample Data in Supabase\n")
+out("=" * 60 + "\n\n")
 
 client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
 # Check each table
 tables = ['users', 'products', 'orders', 'order_items', 'reviews']
 
-print("📊 Checking tables and row counts:")
-print()
+out("📊 Checking tables and row counts:\n\n")
+
+async def count_rows_per_table():
+    """Fallback when get_table_counts isn't deployed: concurrent HEAD count requests"""
+    headers = {
+        "apikey": SUPABASE_SERVICE_ROLE_KEY,
+        "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
+        "Prefer": "count=exact",
+    }
+    
+    async def count_one(http: httpx.AsyncClient, table: str):
+        # HEAD returns only headers; the total is after the slash in Content-Range
+        try:
+            response = await http.head(f"/rest/v1/{table}", params={"select": "*"})
+            response.raise_for_status()
+            return table, int(response.headers["content-range"].split("/")[-1])
+        except Exception as e:
+            return table, e
+    
+    async with httpx.AsyncClient(base_url=SUPABASE_URL, headers=headers) as http:
+        return dict(await asyncio.gather(*(count_one(http, table) for table in tables)))
+
+# All counts in a single round trip (get_table_counts from FRESH_SUPABASE_SETUP.sql)
+try:
+    result = client.rpc('get_table_counts', {'names': tables}).execute()
+    counts = {row['name']: row['cnt'] for row in result.data}
+except Exception:
+    counts = asyncio.run(count_rows_per_table())
 
 total_rows = 0
 for table in tables:
-    try:
-        result = client.table(table).select('*', count='exact').limit(0).execute()
-        count = result.count
-        print(f"   ✅ {table.ljust(15)} - {count} rows")
+    count = counts.get(table, 0)
+    if isinstance(count, Exception):
+        out(f"   ❌ {table.ljust(15)} - Error: {str(count)}\n")
+    else:
+        out(f"   ✅ {table.ljust(15)} - {count} rows\n")
         total_rows += count
-    except Exception as e:
-        print(f"   ❌ {table.ljust(15)} - Error: {str(e)}")
 
-print()
-print("=" * 60)
+out("\n")
+out("=" * 60 + "\n")
 
 if total_rows > 0:
-    print(f"✅ SUCCESS! {total_rows} rows of sample data found!")
-    print()
-    print("🎉 Your database is ready to query!")
-    print()
-    print("Try these natural language queries:")
-    print("  1. 'Show me all users'")
-    print("  2. 'Find pending orders'")
-    print("  3. 'What are the top rated products?'")
-    print("  4. 'Show orders from the last week'")
-    print("  5. 'Count how many products we have'")
-    print()
-    print("Query through:")
-    print("  • Backend API: http://localhost:8000/docs")
-    print("  • Frontend: http://localhost:3000 (if running)")
-    print("  • MCP Server: Through Claude Desktop")
+    out(f"✅ SUCCESS! {total_rows} rows of sample data found!\n")
+    out("\n")
+    out("🎉 Your database is ready to query!\n")
+    out("\n")
+    out("Try these natural language queries:\n")
+    out("  1. 'Show me all users'\n")
+    out("  2. 'Find pending orders'\n")
+    out("  3. 'What are the top rated products?'\n")
+    out("  4. 'Show orders from the last week'\n")
+    out("  5. 'Count how many products we have'\n")
+    out("\n")
+    out("Query through:\n")
+    out("  • Backend API: http://localhost:8000/docs\n")
+    out("  • Frontend: http://localhost:3000 (if running)\n")
+    out("  • MCP Server: Through Claude Desktop\n")
 else:
-    print("❌ No data found. The SQL might not have run successfully.")
-    print()
-    print("Try running sample_data.sql again in Supabase SQL Editor")
+    out("❌ No data found. The SQL might not have run successfully.\n")
+    out("\n")
+    out("Try running sample_data.sql again in Supabase SQL Editor\n")
+
+sys.stdout.write(buf.getvalue())
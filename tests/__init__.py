@@ -0,0 +1,10 @@
+"""
+Unit tests for the backend services
+
+Run from the repository root with: python -m unittest
+"""
+import os
+
+# Settings are required at import time; the tests never talk to these services
+for _name in ("SUPABASE_URL", "SUPABASE_SERVICE_ROLE_KEY", "SUPABASE_ANON_KEY", "GROQ_API_KEY"):
+    os.environ.setdefault(_name, "https://example.supabase.co" if _name == "SUPABASE_URL" else "test")
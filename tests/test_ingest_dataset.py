@@ -0,0 +1,90 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+import ingest_dataset
+from ingest_dataset import CsvChunk, prepare_chunk
+
+
+class TextColumnSelectionTest(unittest.TestCase):
+    def test_column_starting_blank_is_embedded_once_it_holds_text(self):
+        columns = ["id", "note"]
+        reader = iter([
+            CsvChunk(columns, [("1", "nan"), ("2", "nan")], 0),
+            CsvChunk(columns, [("3", "late arrival"), ("4", "nan")], 2),
+            CsvChunk(columns, [("5", "nan")], 4),
+        ])
+        seen = set()
+        
+        chunk, text_idx, batches, inserts = prepare_chunk(reader, "visits", "visits.csv", seen, [])
+        self.assertEqual(text_idx, [])
+        self.assertEqual(batches, [])
+        self.assertEqual(len(inserts[0]), 2)
+        
+        chunk, text_idx, batches, inserts = prepare_chunk(reader, "visits", "visits.csv", seen, text_idx)
+        self.assertEqual(text_idx, [1])
+        texts = batches[0][0]
+        self.assertIn("Record from visits: note=late arrival", texts)
+        
+        # Stays a text column even for a chunk where it is blank again
+        chunk, text_idx, batches, inserts = prepare_chunk(reader, "visits", "visits.csv", seen, text_idx)
+        self.assertEqual(text_idx, [1])
+        self.assertEqual(len(batches), 1)
+        
+        self.assertIsNone(prepare_chunk(reader, "visits", "visits.csv", seen, text_idx))
+    
+    def test_numeric_only_table_is_not_embedded(self):
+        reader = iter([CsvChunk(["x", "y"], [("1", "2.5"), ("3", "nan")], 0)])
+        
+        chunk, text_idx, batches, inserts = prepare_chunk(reader, "readings", "readings.csv", set(), [])
+        
+        self.assertEqual(text_idx, [])
+        self.assertEqual(batches, [])
+        self.assertEqual(inserts, [[{"x": "1", "y": "2.5"}, {"x": "3", "y": None}]])
+
+
+
+@unittest.skipUnless(ingest_dataset.PYARROW_AVAILABLE or ingest_dataset.PANDAS_AVAILABLE,
+                     "CSV ingestion needs pyarrow or pandas")
+class IngestCsvTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w") as f:
+            f.write("name,qty\n" + "".join(f"item{i},{i}\n" for i in range(10)))
+        self.addCleanup(os.remove, self.path)
+        
+        self.rag = mock.MagicMock()
+        self.rag.ingest_documents = mock.AsyncMock(side_effect=lambda texts, metadatas: len(texts))
+        self.supabase = mock.MagicMock()
+        self.supabase.insert_rows = mock.AsyncMock(side_effect=lambda table, rows: len(rows))
+        for name, service in (("get_rag_service", self.rag), ("get_supabase_service", self.supabase)):
+            patcher = mock.patch.object(ingest_dataset, name, return_value=service)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    async def test_reports_success_when_every_batch_lands(self):
+        self.assertTrue(await ingest_dataset.ingest_csv(self.path, "items"))
+    
+    async def test_failed_inserts_are_reported(self):
+        self.supabase.insert_rows.side_effect = RuntimeError("relation \"items\" does not exist")
+        
+        with self.assertLogs(ingest_dataset.logger, "ERROR") as logs:
+            self.assertFalse(await ingest_dataset.ingest_csv(self.path, "items"))
+        
+        self.assertIn("0 inserted (10 failed), 10 embedded (0 failed)", logs.output[-1])
+    
+    async def test_partially_stored_embeddings_are_reported(self):
+        self.rag.ingest_documents.side_effect = lambda texts, metadatas: len(texts) - 1
+        
+        with self.assertLogs(ingest_dataset.logger, "ERROR") as logs:
+            self.assertFalse(await ingest_dataset.ingest_csv(self.path, "items"))
+        
+        self.assertIn("9 embedded (1 failed)", logs.output[-1])
+
+if __name__ == "__main__":
+    unittest.main()
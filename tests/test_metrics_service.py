@@ -0,0 +1,38 @@
+import unittest
+from unittest import mock
+
+from backend.services.metrics_service import MetricsService
+
+
+def make_service(schema):
+    db_service = mock.MagicMock()
+    db_service.get_schema = mock.AsyncMock(return_value=schema)
+    db_service.execute_query = mock.AsyncMock(
+        return_value={"success": True, "rows": [{"count": 3}], "count": 1}
+    )
+    return MetricsService(db_service), db_service
+
+
+class MetricsServiceTest(unittest.IsolatedAsyncioTestCase):
+    async def test_only_metrics_for_existing_tables_are_served(self):
+        service, db_service = make_service({"users": [], "invoices": []})
+        
+        await service.start()
+        self.addAsyncCleanup(service.stop)
+        
+        self.assertEqual(service.match("How many users are there?"), "total_users")
+        self.assertIsNone(service.match("how many orders are there"))
+        db_service.execute_query.assert_awaited_once_with("SELECT COUNT(*) AS count FROM users")
+    
+    async def test_unrelated_schema_starts_no_refresh_loop(self):
+        service, db_service = make_service({"sensor_readings": []})
+        
+        await service.start()
+        
+        self.assertIsNone(service._refresh_task)
+        self.assertIsNone(service.match("how many users are there"))
+        db_service.execute_query.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
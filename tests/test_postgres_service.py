@@ -0,0 +1,77 @@
+import unittest
+from unittest import mock
+
+from backend.config import settings
+from backend.services.postgres_service import PostgresService
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetched = []
+    
+    async def fetch(self, n):
+        self.fetched.append(n)
+        return self.rows[:n]
+
+
+def make_service(rows):
+    """PostgresService on a mock pool whose cursors and fetches return rows"""
+    service = PostgresService()
+    conn = mock.MagicMock()
+    conn.cursor = mock.AsyncMock(return_value=FakeCursor(rows))
+    conn.fetch = mock.AsyncMock(return_value=rows)
+    service.pool = mock.MagicMock()
+    service.pool.acquire.return_value.__aenter__.return_value = conn
+    return service, conn
+
+
+class ExecuteQueryRowCapTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(settings, "max_rows_affected", 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    async def test_select_is_capped(self):
+        service, conn = make_service([{"id": i} for i in range(10)])
+        
+        result = await service.execute_query("SELECT id FROM users")
+        
+        self.assertEqual(result["count"], 3)
+        self.assertTrue(result["truncated"])
+        conn.cursor.assert_awaited_once_with("SELECT id FROM users")
+        conn.fetch.assert_not_called()
+    
+    async def test_cte_is_capped(self):
+        service, conn = make_service([{"id": i} for i in range(10)])
+        sql = "WITH recent AS (SELECT * FROM orders) SELECT id FROM recent"
+        
+        result = await service.execute_query(sql)
+        
+        self.assertEqual(result["count"], 3)
+        self.assertTrue(result["truncated"])
+        conn.cursor.assert_awaited_once_with(sql)
+        self.assertEqual(conn.cursor.return_value.fetched, [4])
+    
+    async def test_fetch_first_query_runs_unchanged(self):
+        service, conn = make_service([{"id": 1}, {"id": 2}])
+        sql = "SELECT id FROM users ORDER BY id FETCH FIRST 2 ROWS ONLY -- newest"
+        
+        result = await service.execute_query(sql)
+        
+        self.assertEqual(result["count"], 2)
+        self.assertFalse(result["truncated"])
+        conn.cursor.assert_awaited_once_with(sql)
+    
+    async def test_write_is_not_capped(self):
+        service, conn = make_service([])
+        
+        result = await service.execute_query("UPDATE users SET role = 'admin' WHERE id = 1")
+        
+        self.assertTrue(result["success"])
+        conn.fetch.assert_awaited_once()
+        conn.cursor.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
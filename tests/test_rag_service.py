@@ -0,0 +1,48 @@
+import unittest
+from unittest import mock
+
+from backend.services import rag_service
+from backend.services.rag_service import SemanticCache
+
+
+class SemanticCacheTest(unittest.TestCase):
+    def test_fresh_match_is_found_behind_expired_duplicate(self):
+        cache = SemanticCache(capacity=8, threshold=0.97, ttl=60)
+        with mock.patch.object(rag_service.time, "monotonic", return_value=0.0):
+            cache.put([1.0, 0.0], [{"content": "stale"}])
+        with mock.patch.object(rag_service.time, "monotonic", return_value=100.0):
+            cache.put([0.999, 0.01], [{"content": "fresh"}])
+            
+            # The expired entry is the closer match but must not win
+            self.assertEqual(cache.get([1.0, 0.0]), [{"content": "fresh"}])
+    
+    def test_expired_slot_is_reused_before_growing(self):
+        cache = SemanticCache(capacity=8, threshold=0.97, ttl=60)
+        with mock.patch.object(rag_service.time, "monotonic", return_value=0.0):
+            cache.put([1.0, 0.0], [{"content": "old"}])
+        with mock.patch.object(rag_service.time, "monotonic", return_value=100.0):
+            cache.put([0.0, 1.0], [{"content": "new"}])
+            
+            self.assertEqual(len(cache._documents), 1)
+            self.assertIsNone(cache.get([1.0, 0.0]))
+            self.assertEqual(cache.get([0.0, 1.0]), [{"content": "new"}])
+
+
+class RetrieveContextTest(unittest.IsolatedAsyncioTestCase):
+    async def test_empty_results_are_not_cached(self):
+        with mock.patch.object(rag_service, "SupabaseService"), \
+                mock.patch.object(rag_service, "EmbeddingService"), \
+                mock.patch.object(rag_service.settings, "enable_rag", True):
+            service = rag_service.RAGService()
+        service._embed_query = mock.Mock(return_value=[1.0, 0.0])
+        service.supabase.search_documents = mock.AsyncMock(side_effect=[[], [{"content": "doc"}]])
+        
+        with mock.patch.object(rag_service.settings, "enable_rag", True):
+            self.assertEqual(await service.retrieve_context("show users"), [])
+            self.assertEqual(await service.retrieve_context("show users"), [{"content": "doc"}])
+        
+        self.assertEqual(service.supabase.search_documents.await_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+from backend.utils.sql_safety import SQLSafetyValidator
+
+
+class AllowedTablesTest(unittest.TestCase):
+    def setUp(self):
+        self.validator = SQLSafetyValidator(allowed_tables=["users", "orders"])
+    
+    def test_cte_name_is_not_an_unauthorized_table(self):
+        result = self.validator.validate("WITH a AS (SELECT * FROM users) SELECT * FROM a")
+        
+        self.assertTrue(result.is_valid, result.errors)
+    
+    def test_tables_read_inside_cte_are_checked(self):
+        result = self.validator.validate(
+            "WITH a AS (SELECT * FROM users), b AS (SELECT * FROM secrets) SELECT * FROM a, b"
+        )
+        
+        self.assertFalse(result.is_valid)
+        self.assertEqual(result.errors, ("Unauthorized tables: secrets",))
+    
+    def test_recursive_cte_name_is_not_an_unauthorized_table(self):
+        result = self.validator.validate(
+            "WITH RECURSIVE t(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM t WHERE n < 5) SELECT n FROM t"
+        )
+        
+        self.assertTrue(result.is_valid, result.errors)
+    
+    def test_unauthorized_table_is_rejected(self):
+        result = self.validator.validate("SELECT * FROM secrets")
+        
+        self.assertFalse(result.is_valid)
+        self.assertEqual(result.errors, ("Unauthorized tables: secrets",))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from postgrest.exceptions import APIError
+
+from backend.services import supabase_service
+from backend.services.supabase_service import SupabaseService
+
+
+def make_service() -> SupabaseService:
+    """SupabaseService wired to a mock supabase-py client"""
+    with mock.patch.object(supabase_service, "get_supabase_client", return_value=mock.MagicMock()):
+        return SupabaseService()
+
+
+class SearchDocumentsTest(unittest.IsolatedAsyncioTestCase):
+    async def test_missing_match_rpc_switches_to_local_search(self):
+        service = make_service()
+        service.client.rpc.return_value.execute.side_effect = APIError(
+            {"code": "PGRST202", "message": "Could not find the function public.match_documents"}
+        )
+        service._search_documents_local = mock.AsyncMock(return_value=[{"id": 1}])
+        
+        self.assertEqual(await service.search_documents([0.1, 0.2]), [{"id": 1}])
+        self.assertTrue(service._match_rpc_missing)
+    
+    async def test_error_inside_match_rpc_keeps_using_it(self):
+        service = make_service()
+        service.client.rpc.return_value.execute.side_effect = APIError(
+            {"code": "22000", "message": "different vector dimensions 384 and 2 in match_documents"}
+        )
+        service._search_documents_local = mock.AsyncMock(return_value=[{"id": 1}])
+        
+        self.assertEqual(await service.search_documents([0.1, 0.2]), [])
+        self.assertFalse(service._match_rpc_missing)
+        service._search_documents_local.assert_not_called()
+
+
+class DocumentIndexTest(unittest.IsolatedAsyncioTestCase):
+    async def test_empty_documents_table_is_cached(self):
+        service = make_service()
+        select = service.client.table.return_value.select.return_value
+        select.order.return_value.range.return_value.execute.return_value = SimpleNamespace(data=[])
+        
+        self.assertEqual(await service._search_documents_local([0.1, 0.2], 5), [])
+        self.assertEqual(await service._search_documents_local([0.1, 0.2], 5), [])
+        
+        # Loaded once, in a stable order, then served from the cached empty index
+        select.order.assert_called_once_with('id')
+        self.assertEqual(select.order.return_value.range.call_count, 1)
+        matrix, scales, documents = service._doc_index
+        self.assertEqual(matrix.shape, (0, 0))
+        self.assertEqual(len(scales), 0)
+        self.assertEqual(documents, [])
+
+
+
+class ExecuteQueryTest(unittest.IsolatedAsyncioTestCase):
+    async def test_missing_rpc_switches_to_mock_result(self):
+        service = make_service()
+        service.client.rpc.return_value.execute.side_effect = APIError(
+            {"code": "PGRST202", "message": "Could not find the function public.execute_safe_query"}
+        )
+        
+        result = await service.execute_query("SELECT 1")
+        
+        self.assertTrue(result["success"])
+        self.assertIs(service._rpc_available, False)
+    
+    async def test_query_error_does_not_disable_rpc(self):
+        service = make_service()
+        service.client.rpc.return_value.execute.side_effect = APIError(
+            {"code": "42601", "message": 'syntax error at or near "FORM" in execute_safe_query'}
+        )
+        
+        result = await service.execute_query("SELECT * FORM users")
+        
+        self.assertFalse(result["success"])
+        self.assertIsNot(service._rpc_available, False)
+        
+        # The next query still goes to the RPC
+        service.client.rpc.return_value.execute.side_effect = None
+        service.client.rpc.return_value.execute.return_value = SimpleNamespace(data=[{"id": 1}])
+        result = await service.execute_query("SELECT * FROM users")
+        self.assertEqual(result["rows"], [{"id": 1}])
+        self.assertIs(service._rpc_available, True)
+
+if __name__ == "__main__":
+    unittest.main()